@@ -6,10 +6,22 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import imp
+import os
 
-def do_compile_internal(obj, src, path, modname, modpath, nsvars=None, ignorable_exceptions=None):
-    compiled = compile(src, path, 'exec')
+magic = imp.get_magic()
 
+
+def list_dir(path):
+    """(name, is a directory, is a symlink) for everything in path, sorted by name"""
+    return sorted((n, os.path.isdir(os.path.join(path, n)), os.path.islink(os.path.join(path, n)))
+                  for n in os.listdir(path))
+
+
+def compile_source(src, path):
+    return compile(src, path, 'exec')
+
+
+def do_compile_internal(obj, compiled, modname, modpath, nsvars=None, ignorable_exceptions=None):
     mod = imp.new_module(modname)
     mod.__file__ = modpath
 
@@ -8,10 +8,21 @@ from __future__ import unicode_literals
 import importlib
 import importlib.util
 import importlib.machinery
+import os
 
-def do_compile_internal(obj, src, path, modname, modpath, nsvars=None, ignorable_exceptions=None):
-    compiled = compile(src, path, 'exec')
+magic = importlib.util.MAGIC_NUMBER
 
+
+def list_dir(path):
+    """(name, is a directory, is a symlink) for everything in path, sorted by name"""
+    return sorted((e.name, e.is_dir(), e.is_symlink()) for e in os.scandir(path))
+
+
+def compile_source(src, path):
+    return compile(src, path, 'exec')
+
+
+def do_compile_internal(obj, compiled, modname, modpath, nsvars=None, ignorable_exceptions=None):
     mod = importlib.util.module_from_spec(importlib.machinery.ModuleSpec(modname, None, origin=modpath))
 
     if nsvars is not None:
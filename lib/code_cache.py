@@ -0,0 +1,75 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import marshal
+import os
+import sys
+
+from load_python_core import compile_source, magic
+from util import mkdir_p
+
+
+class CodeCache(object):
+    """code objects for our sources, keyed by source hash and kept in memory and (optionally) on disk"""
+    def __init__(self, path=None):
+        self.path = path
+        self.codes = {}
+
+    def key(self, src, filename):
+        h = hashlib.sha1()
+        h.update(magic)
+        h.update(sys.version.encode('utf8'))
+        h.update(b'\0')
+        h.update(filename.encode('utf8'))
+        h.update(b'\0')
+        h.update(src.encode('utf8') if not isinstance(src, bytes) else src)
+        return h.hexdigest()
+
+    def compile(self, src, filename):
+        key = self.key(src, filename)
+        try:
+            return self.codes[key]
+        except KeyError:
+            pass
+
+        code = self.load(key)
+        if code is None:
+            code = compile_source(src, filename)
+            self.save(key, code)
+
+        self.codes[key] = code
+        return code
+
+    def cache_file(self, key):
+        return os.path.join(self.path, 'code', key[:2], key[2:])
+
+    def load(self, key):
+        if self.path is None:
+            return None
+        try:
+            with open(self.cache_file(key), 'rb') as f:
+                return marshal.loads(f.read())
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def save(self, key, code):
+        if self.path is None:
+            return
+        filename = self.cache_file(key)
+        # per process, --jobs workers can be compiling the same import at the same time
+        tmpname = '{}.{}.tmp'.format(filename, os.getpid())
+        try:
+            mkdir_p(os.path.dirname(filename))
+            with open(tmpname, 'wb') as f:
+                f.write(marshal.dumps(code))
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
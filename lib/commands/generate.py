@@ -7,7 +7,9 @@ from __future__ import unicode_literals
 
 from command import Command
 from .bases import CommandRepositoryBase, LoaderBase
+from output import IncrementalFallback
 import load_python
+import obj_registry
 import sys
 
 
@@ -17,15 +19,38 @@ class Command_generate(Command, LoaderBase, CommandRepositoryBase):
     user_error = True
 
     def populate_args(self, parser):
-        pass
+        parser.add_argument('-i', '--incremental', action='store_true',
+                            help='only run the sources which changed since the last --incremental run')
+        parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='number of processes to run the sources and render and write the output with')
+        parser.add_argument('--low-memory', action='store_true',
+                            help="don't keep objects and sources alive once nothing can reach them any more")
 
     def run(self, args):
         self.loader_setup()
+        obj_registry.reset(args.low_memory)
 
         r = self.get_repository()
 
         collection = load_python.PythonFileCollection(r)
 
-        collection.load_all_python(r.sources)
-
-        collection.gen_output()
+        jobs = max(args.jobs, 1)
+
+        if not args.incremental:
+            collection.load_all_python(r.sources, jobs)
+            collection.gen_output(jobs, args.low_memory)
+            return
+
+        try:
+            collection.load_incremental(r.sources)
+            collection.gen_output(jobs, args.low_memory)
+        except IncrementalFallback as e:
+            collection.debug(1, 'incremental: {}, running everything'.format(e))
+            collection.unload_pythonpath_modules()
+            obj_registry.reset(args.low_memory)
+            r = self.get_repository()
+            collection = load_python.PythonFileCollection(r)
+            collection.load_all_python(r.sources)
+            collection.gen_output(jobs, args.low_memory)
+
+        collection.save_state()
@@ -0,0 +1,162 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import hashlib
+import json
+import os
+import sys
+
+from util import mkdir_p
+
+STATE_VERSION = 2
+
+
+class IncrementalState(object):
+    """what a previous generate ran, what it read and what it output"""
+    def __init__(self, repository, path):
+        self.repository = repository
+        self.path = path
+        self.files = {}
+        self.outputs = []
+
+    @classmethod
+    def hash_file(cls, path):
+        try:
+            with open(path, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except (IOError, OSError):
+            return None
+
+    def source_path(self, src_rel_path):
+        return os.path.join(self.repository.basepath, self.repository.sources, src_rel_path)
+
+    def fingerprint(self):
+        # anything which can change the output without being a tracked source
+        h = hashlib.sha1()
+        h.update('{}\0{}\0{}\0'.format(STATE_VERSION, sys.version, self.repository.basepath).encode('utf8'))
+
+        def _add_tree(base):
+            for dirpath, dirnames, filenames in os.walk(base):
+                dirnames.sort()
+                for fn in sorted(filenames):
+                    if fn.endswith('.py'):
+                        full = os.path.join(dirpath, fn)
+                        h.update('{}\0{}\0'.format(full, self.hash_file(full)).encode('utf8'))
+
+        _add_tree(os.path.dirname(os.path.abspath(__file__)))
+        for p in self.repository.pythonpath:
+            _add_tree(p)
+
+        rubiks_file = os.path.join(self.repository.basepath, '.rubiks')
+        h.update('{}\0'.format(self.hash_file(rubiks_file)).encode('utf8'))
+        return h.hexdigest()
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if state.get('version', None) != STATE_VERSION or state.get('fingerprint', None) != self.fingerprint():
+            return False
+
+        self.files = state['files']
+        self.outputs = state['outputs']
+        return True
+
+    def file_entry(self, src_rel_path, deps, inputs, volatile):
+        return {
+            'hash': self.hash_file(self.source_path(src_rel_path)),
+            'deps': sorted(deps),
+            'inputs': dict((i, self.hash_file(os.path.join(self.repository.basepath, i))) for i in inputs),
+            'volatile': volatile,
+            }
+
+    def save(self, files, outputs):
+        state = {
+            'version': STATE_VERSION,
+            'fingerprint': self.fingerprint(),
+            'files': files,
+            'outputs': outputs,
+            }
+        # per process, so that a concurrent run can't swap in its own state for ours halfway through
+        tmpname = '{}.{}.tmp'.format(self.path, os.getpid())
+        mkdir_p(os.path.dirname(self.path))
+        try:
+            with open(tmpname, 'w') as f:
+                json.dump(state, f, sort_keys=True)
+            os.rename(tmpname, self.path)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+            raise
+
+    def changed_files(self):
+        ret = set()
+        for f, info in self.files.items():
+            if info['volatile'] or info['hash'] != self.hash_file(self.source_path(f)):
+                ret.add(f)
+                continue
+            for i, ihash in info['inputs'].items():
+                if ihash != self.hash_file(os.path.join(self.repository.basepath, i)):
+                    ret.add(f)
+                    break
+        return ret
+
+    def closure(self, start, edges):
+        ret = set(start)
+        todo = list(start)
+        while len(todo) != 0:
+            f = todo.pop()
+            for nf in edges.get(f, ()):
+                if nf not in ret:
+                    ret.add(nf)
+                    todo.append(nf)
+        return ret
+
+    def plan(self, tops):
+        """returns (files to run, files that will get run, outputs to reuse) or None to run everything"""
+        deps = dict((f, self.files[f]['deps']) for f in self.files)
+        rdeps = {}
+        for f in deps:
+            for d in deps[f]:
+                rdeps.setdefault(d, set()).add(f)
+
+        changed = self.changed_files()
+        dirty = self.closure(changed, rdeps)
+        load = set(t for t in tops if t in dirty or t not in self.files)
+
+        if len(load) + len(changed) != 0 and any(o['late_render'] for o in self.outputs):
+            return None
+
+        reaches = dict((t, self.closure((t,), deps)) for t in tops)
+        while True:
+            compiled = self.closure(load, deps) | changed
+            more = set()
+            for o in self.outputs:
+                if o['is_namespace'] or not any(s in compiled for s in o['sources']):
+                    continue
+                for s in o['sources']:
+                    if s not in compiled:
+                        more.update(t for t in tops if s in reaches[t])
+            if more.issubset(load):
+                break
+            load.update(more)
+
+        reused = []
+        for o in self.outputs:
+            if not any(s in compiled for s in o['sources']):
+                reused.append(o)
+            elif o['is_namespace'] and not all(s in compiled for s in o['sources']):
+                o = dict(o)
+                o['sources'] = [s for s in o['sources'] if s not in compiled]
+                reused.append(o)
+
+        return load, compiled, reused
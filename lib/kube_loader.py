@@ -16,15 +16,8 @@ kube_objs._loader()
 import obj_registry
 
 # backlink types
-for k in kube_obj.KubeBaseObj.get_subclasses(non_abstract=False, include_self=False, depth_first=True):
-    if k is kube_obj.KubeBaseObj or k is kube_obj.KubeObj or k is kube_obj.KubeSubObj:
+index = kube_obj.KubeBaseObj.type_index(rebuild=True)
+for k in index.types:
+    if k is kube_obj.KubeObj or k is kube_obj.KubeSubObj:
         continue
-    k._parent_types = {}
-
-for k in kube_obj.KubeBaseObj.get_subclasses(non_abstract=False, include_self=False, depth_first=True):
-    if k is kube_obj.KubeBaseObj or k is kube_obj.KubeObj or k is kube_obj.KubeSubObj:
-        continue
-    name = k.__name__
-    for ct in k.get_child_types().values():
-        for cct in ct.get_subclasses(non_abstract=False, include_self=True):
-            cct._parent_types[name] = k
+    k._parent_types = index.parents[k]
@@ -6,7 +6,6 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import copy
-import traceback
 import sys
 from collections import OrderedDict
 
@@ -14,13 +13,18 @@ from kube_types import *
 from user_error import UserError, paths as user_error_paths
 
 
-def _rec_update_objs(obj):
-    for k in obj._data:
-        if isinstance(obj._data[k], KubeBaseObj):
-            obj._data[k]._caller_file = obj._caller_file
-            obj._data[k]._caller_line = obj._caller_line
-            obj._data[k]._caller_fn = obj._caller_fn
-            _rec_update_objs(obj._data[k])
+_caller_sites = {}
+
+
+def _caller_info(depth=2):
+    # file and function name without reading the source through linecache, shared by everything made
+    # from the same code
+    frame = sys._getframe(depth)
+    try:
+        site = _caller_sites[frame.f_code]
+    except KeyError:
+        site = _caller_sites[frame.f_code] = (frame.f_code.co_filename, frame.f_code.co_name)
+    return (site, frame.f_lineno)
 
 
 def order_dict(src, order):
@@ -38,6 +42,330 @@ def order_dict(src, order):
     return ret
 
 
+try:
+    _immutable_types = (type(None), bool, int, long, float, str, unicode, bytes)
+except NameError:
+    _immutable_types = (type(None), bool, int, float, str, bytes)
+
+
+class KubeSharedDefault(object):
+    """a mutable default shared by all objects of a class until one of them looks at it"""
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def render_value(self):
+        # sub-objects are only read while rendering so can stay shared, anything else gets copied
+        if isinstance(self.obj, KubeBaseObj):
+            return self.obj
+        return copy.deepcopy(self.obj)
+
+    def share(self):
+        return self
+
+    def copy(self):
+        return copy.deepcopy(self.obj)
+
+
+class KubeSharedClone(KubeSharedDefault):
+    """a value clone() left shared with the object it was cloned from, see KubeCloneGroup"""
+    __slots__ = ('group',)
+
+    def __init__(self, obj, group):
+        self.obj = obj
+        self.group = group
+
+    def __deepcopy__(self, memo):
+        return self.group.share()
+
+    def __reduce_ex__(self, protocol):
+        return (copy.deepcopy, (self.obj,))
+
+    def render_value(self):
+        # only ever holds objects, or lists and dicts of objects and immutable values
+        if isinstance(self.obj, KubeBaseObj):
+            return self.obj
+        return copy.copy(self.obj)
+
+    def share(self):
+        return self.group.share()
+
+    def copy(self):
+        # the clone is going to change it, so it gets what clone() would have made
+        self.group.members.remove(self)
+        if isinstance(self.obj, KubeBaseObj):
+            return self.obj._clone()
+        return copy.deepcopy(self.obj)
+
+
+def _share_nodes(v, nodes, inner=False):
+    # like render_state(): the data of everything under v, if all of it can only change through that data
+    if isinstance(v, (_immutable_types, KubeSharedDefault)):
+        return True
+    elif isinstance(v, KubeBaseObj):
+        if not isinstance(v._data, KubeData) or v._data.version is None or v.has_metadata or v._uses_namespace:
+            return False
+        nodes.append(v._data)
+        return all(_share_nodes(x, nodes) for x in list.__iter__(v._data))
+    elif not inner and isinstance(v, list):
+        return all(_share_nodes(x, nodes, True) for x in v)
+    elif not inner and isinstance(v, dict):
+        return all(_share_nodes(x, nodes, True) for x in v.values())
+    return False
+
+
+class KubeCloneGroup(object):
+    """obj shared by the clones in members - it hangs off the data of everything under obj (nodes) and gets
+    split off onto a copy before any of that changes"""
+    __slots__ = ('obj', 'nodes', 'members')
+
+    def __init__(self, obj, nodes):
+        self.obj = obj
+        self.nodes = nodes
+        self.members = []
+        for d in nodes:
+            if d.sharers is None:
+                d.sharers = []
+            d.sharers.append(self)
+
+    def share(self):
+        ret = KubeSharedClone(self.obj, self)
+        self.members.append(ret)
+        return ret
+
+    def split(self):
+        for d in self.nodes:
+            d.sharers.remove(self)
+            if len(d.sharers) == 0:
+                d.sharers = None
+        self.nodes = []
+
+        if len(self.members) != 0:
+            # nothing else can get at the copy, so it needs no nodes
+            group = KubeCloneGroup(copy.deepcopy(self.obj), [])
+            group.members = self.members
+            for m in group.members:
+                m.obj = group.obj
+                m.group = group
+            self.members = []
+
+
+class KubeData(list):
+    """the values of an object, one for each field of its class - looks enough like a dict
+
+    version goes up with every change, or is None once something mutable has been handed out as then
+    we can't see what happens to it. owner is the object, once the object registry wants to hear about
+    every field it's given"""
+    __slots__ = ('schema', 'version', 'sharers', 'owner')
+
+    def __getitem__(self, k):
+        v = self.own(k)
+        if self.version is not None and not isinstance(v, _immutable_types) and not isinstance(v, KubeBaseObj):
+            self.version = None
+        return v
+
+    def __setitem__(self, k, v):
+        if self.sharers is not None:
+            self.split()
+        i = self.schema.index[k]
+        if self.owner is not None:
+            self.owner.field_changed(k, list.__getitem__(self, i), v)
+        list.__setitem__(self, i, v)
+        if self.version is not None:
+            self.version += 1
+            if not isinstance(v, _immutable_types) and not isinstance(v, KubeBaseObj):
+                # whoever gave it us can still change it
+                self.version = None
+
+    def put(self, k, v):
+        """set k to something nobody else has a reference to"""
+        if self.sharers is not None:
+            self.split()
+        i = self.schema.index[k]
+        if self.owner is not None:
+            self.owner.field_changed(k, list.__getitem__(self, i), v)
+        list.__setitem__(self, i, v)
+        self.changed()
+
+    def own(self, k):
+        """the value for k without giving up on tracking changes, for callers which change it via changed()"""
+        i = self.schema.index[k]
+        v = list.__getitem__(self, i)
+        if self.sharers is not None and not isinstance(v, _immutable_types) and not isinstance(v, KubeBaseObj):
+            # clones sharing us only watch our objects, not what we're about to hand out
+            self.split()
+        if isinstance(v, KubeSharedDefault):
+            # whoever asked might change it, so it needs its own copy from now on
+            old, v = v, v.copy()
+            if self.owner is not None:
+                self.owner.field_changed(k, old, v)
+            list.__setitem__(self, i, v)
+        return v
+
+    def changed(self):
+        if self.sharers is not None:
+            self.split()
+        if self.version is not None:
+            self.version += 1
+
+    def share(self, k):
+        """what a clone can hold for k instead of a copy, None if it needs a copy"""
+        v = list.__getitem__(self, self.schema.index[k])
+        if isinstance(v, _immutable_types):
+            return v
+        elif isinstance(v, KubeSharedDefault):
+            return v.share()
+
+        holder = v._data if isinstance(v, KubeBaseObj) else self
+        for g in getattr(holder, 'sharers', None) or ():
+            if g.obj is v:
+                return g.share()
+
+        if isinstance(v, KubeBaseObj):
+            nodes = []
+        elif self.version is not None:
+            # our own lists and dicts only change through us, so we have to watch for that too
+            nodes = [self]
+        else:
+            return None
+        if not _share_nodes(v, nodes):
+            return None
+        return KubeCloneGroup(v, nodes).share()
+
+    def split(self):
+        """we're about to change, so anything shared with clones has to be copied for them first"""
+        while self.sharers is not None:
+            self.sharers[0].split()
+
+    def reset(self):
+        """back to how new_data() makes it"""
+        for k, v in zip(self.schema.fields, self.schema.initial):
+            self.put(k, v)
+
+    def __contains__(self, k):
+        return k in self.schema.index
+
+    def __iter__(self):
+        return iter(self.schema.fields)
+
+    def __reduce_ex__(self, protocol):
+        return (_kube_data, (self.schema.kls, self.values()))
+
+    def __deepcopy__(self, memo):
+        ret = KubeData(copy.deepcopy(self.values(), memo))
+        ret.schema = self.schema
+        ret.version = 0
+        ret.sharers = None
+        ret.owner = None
+        return ret
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def get(self, k, default=None):
+        if k in self.schema.index:
+            return self[k]
+        return default
+
+    def keys(self):
+        return list(self.schema.fields)
+
+    def values(self):
+        return list(list.__iter__(self))
+
+    def items(self):
+        return list(zip(self.schema.fields, list.__iter__(self)))
+
+
+def _kube_data(kls, values):
+    ret = KubeData(values)
+    ret.schema = kls._get_schema()
+    ret.version = 0
+    ret.sharers = None
+    ret.owner = None
+    return ret
+
+
+class KubeSchema(object):
+    """the merged _defaults/_map/_parse/_exclude (and types) of a class, worked out once - don't modify"""
+    def __init__(self, kls):
+        self.kls = kls
+        self.identifier = getattr(kls, 'identifier', None)
+        self.defaults = kls._find_defaults('_defaults')
+        self.map = kls._find_defaults('_map')
+        self.parse = kls._find_defaults('_parse')
+        self.exclude = kls._find_defaults('_exclude')
+        self.types = None
+
+        # mutable defaults are shared until first got at (see KubeData.__getitem__)
+        self.fields = tuple(self.defaults) + tuple(k for k in self.map if k not in self.defaults)
+        self.index = dict((k, i) for i, k in enumerate(self.fields))
+        self.initial = []
+        for k in self.fields:
+            v = None if k in self.map else self.defaults[k]
+            if not isinstance(v, _immutable_types):
+                v = KubeSharedDefault(v)
+            self.initial.append(v)
+
+        # the order of the top-level keys do_render puts out
+        self.render_order = None
+        if hasattr(kls, 'identifier') or kls.has_metadata:
+            self.render_order = ()
+            if hasattr(kls, 'identifier'):
+                self.render_order += (kls.identifier,)
+            if kls.has_metadata:
+                self.render_order += ('metadata', 'spec')
+
+        # new_<field> and new_<field without the s> for get_obj, and what each one constructs once worked out
+        self.new = {}
+        for k in self.fields:
+            self.new['new_' + k] = k
+        for k in self.fields:
+            if k.endswith('s'):
+                self.new.setdefault('new_' + k[:-1], k)
+        self.new_types = {}
+
+        self.xf = {}
+        for k in list(self.defaults) + list(self.map):
+            if hasattr(kls, 'xf_{}'.format(k)):
+                self.xf[k] = 'xf_{}'.format(k)
+            elif k in self.map and hasattr(kls, 'xf_{}'.format(self.map[k])):
+                self.xf[k] = 'xf_{}'.format(self.map[k])
+
+    def new_data(self):
+        ret = KubeData(self.initial)
+        ret.schema = self
+        ret.version = 0
+        ret.sharers = None
+        ret.owner = None
+        return ret
+
+
+class KubeTypeIndex(object):
+    """where each class is in the KubeBaseObj hierarchy, worked out once all of them are loaded - don't modify"""
+    def __init__(self):
+        self.types = frozenset(KubeBaseObj._find_subclasses(non_abstract=False))
+        self.subclasses = {}
+
+        # what can be constructed in place of each class, and the classes that can hold each one
+        self.concrete = {}
+        self.parents = {}
+        for k in self.types:
+            self.concrete[k] = frozenset(k._find_subclasses(include_self=True))
+            self.parents[k] = {}
+
+        for k in KubeBaseObj._find_subclasses(non_abstract=False, depth_first=True):
+            if k is KubeObj or k is KubeSubObj:
+                continue
+            for ct in k.get_child_types().values():
+                for cct in ct._find_subclasses(non_abstract=False, include_self=True):
+                    self.parents[cct][k.__name__] = k
+
+
 class KubeObjNoNamespace(Exception):
     pass
 
@@ -60,9 +388,22 @@ class KubeAttributeError(UserError, AttributeError):
     pass
 
 
-class KubeBaseObj(object):
+class KubeObjMeta(type):
+    """gives each kube object class empty __slots__ unless it has its own, so that instances don't get a
+    __dict__ - or labels and annotations if it's the first with metadata"""
+    def __new__(mcs, name, bases, attrs):
+        if '__slots__' not in attrs:
+            if attrs.get('has_metadata', False) and not any(hasattr(b, 'labels') for b in bases):
+                attrs['__slots__'] = ('labels', 'annotations')
+            else:
+                attrs['__slots__'] = ()
+        return type.__new__(mcs, name, bases, attrs)
+
+
+class KubeBaseObj(KubeObjMeta(str('KubeObjBase'), (object,), {})):
     _default_ns = 'default'
     _default_cluster = None
+    _transient = 0
     _uses_namespace = False
     _defaults = {}
     _types = {}
@@ -74,24 +415,26 @@ class KubeBaseObj(object):
     has_metadata = False
     _is_openshift = False
     _always_regenerate = False
+    _type_index = None
+
+    # labels and annotations are added by KubeObjMeta for the classes with metadata
+    __slots__ = ('_data', '_caller_site', '_caller_line', 'namespace', '_in_cluster', '_valid_state', '__weakref__')
 
     def __init__(self, *args, **kwargs):
         # put the identifier in if it's specified
         if hasattr(self, 'identifier') and len(args) > 0 and self.identifier not in kwargs:
             kwargs[self.identifier] = args[0]
-        self._data = self.__class__._find_defaults('_defaults')
-
-        self._caller_file, self._caller_line, self._caller_fn = traceback.extract_stack(limit=2)[0][0:3]
+        self._data = self.__class__._get_schema().new_data()
+        object.__setattr__(self, '_valid_state', None)
 
-        for k in self.__class__._find_defaults('_map'):
-            self._data[k] = None
+        self._caller_site, self._caller_line = _caller_info()
 
         self.namespace = None
         self.set_namespace(KubeBaseObj._default_ns)
 
         self._in_cluster = KubeBaseObj._default_cluster
 
-        if hasattr(self, 'add_obj'):
+        if hasattr(self, 'add_obj') and KubeBaseObj._transient == 0:
             self.add_obj()
 
         if self.has_metadata:
@@ -113,19 +456,40 @@ class KubeBaseObj(object):
             if not isinstance(kwargs[k], (list, dict)):
                 self._data[k] = kwargs[k]
             elif isinstance(kwargs[k], list):
-                self._data[k] = []
-                self._data[k].extend(kwargs[k])
+                self._data.put(k, list(kwargs[k]))
             else:
-                if not isinstance(self._data[k], dict):
-                    self._data[k] = {}
-                self._data[k].update(kwargs[k])
+                if not isinstance(self._data.own(k), dict):
+                    self._data.put(k, {})
+                self._data.own(k).update(kwargs[k])
+                self._data.changed()
+
+    @property
+    def _caller_file(self):
+        return self._caller_site[0]
 
-        _rec_update_objs(self)
+    @property
+    def _caller_fn(self):
+        return self._caller_site[1]
+
+    def __getstate__(self):
+        ret = {}
+        for kls in self.__class__.__mro__:
+            for k in kls.__dict__.get('__slots__', ()):
+                if k == '__weakref__':
+                    continue
+                try:
+                    ret[k] = object.__getattribute__(self, k)
+                except AttributeError:
+                    pass
+        return ret
+
+    def __setstate__(self, state):
+        for k in state:
+            object.__setattr__(self, k, state[k])
 
     def clone(self, *args, **kwargs):
         ret = self._clone()
-        ret._caller_file, ret._caller_line, ret._caller_fn = traceback.extract_stack(limit=2)[0][0:3]
-        _rec_update_objs(self)
+        ret._caller_site, ret._caller_line = _caller_info()
 
         if hasattr(self, 'identifier') and len(args) > 0 and self.identifier not in kwargs:
             kwargs[self.identifier] = args[0]
@@ -142,23 +506,27 @@ class KubeBaseObj(object):
             if not isinstance(kwargs[k], (list, dict)):
                 ret._data[k] = kwargs[k]
             elif isinstance(kwargs[k], list):
-                ret._data[k] = []
-                ret._data[k].extend(kwargs[k])
+                ret._data.put(k, list(kwargs[k]))
             else:
-                if not isinstance(ret._data[k], dict):
-                    ret._data[k] = {}
-                ret._data[k].update(kwargs[k])
+                if not isinstance(ret._data.own(k), dict):
+                    ret._data.put(k, {})
+                ret._data.own(k).update(kwargs[k])
+                ret._data.changed()
 
         return ret
 
     def _clone(self):
         ret = self.__class__()
 
-        for k in self._data:
-            if isinstance(self._data[k], KubeBaseObj):
-                ret._data[k] = self._data[k]._clone()
+        # anything that can be is left shared until one side changes it
+        for k, v in self._data.items():
+            shared = self._data.share(k)
+            if shared is not None:
+                ret._data.put(k, shared)
+            elif isinstance(v, KubeBaseObj):
+                ret._data[k] = v._clone()
             else:
-                ret._data[k] = copy.deepcopy(self._data[k])
+                ret._data.put(k, copy.deepcopy(v))
 
         if self.has_metadata:
             ret.annotations = copy.deepcopy(self.annotations)
@@ -166,6 +534,14 @@ class KubeBaseObj(object):
 
         return ret
 
+    @classmethod
+    def _get_schema(cls):
+        try:
+            return cls.__dict__['_schema']
+        except KeyError:
+            cls._schema = KubeSchema(cls)
+            return cls._schema
+
     @classmethod
     def _find_defaults(cls, clsmap):
         ret = {}
@@ -195,7 +571,8 @@ class KubeBaseObj(object):
 
     @classmethod
     def resolve_types(cls):
-        if not hasattr(cls, '_resolved_types'):
+        schema = cls._get_schema()
+        if schema.types is None:
             def basic_validation(typ):
                 if isinstance(typ, KubeType):
                     return typ
@@ -242,9 +619,9 @@ class KubeBaseObj(object):
                     raise KubeTypeUnresolvable(
                         "Couldn't resolve (from {}) {} into a default type".format(k, repr(types[k])))
 
-            cls._resolved_types = types
+            schema.types = types
 
-        return cls._resolved_types
+        return schema.types
 
     @classmethod
     def get_child_types(cls):
@@ -271,8 +648,22 @@ class KubeBaseObj(object):
         # python 3
         return this is base
 
+    @classmethod
+    def type_index(cls, rebuild=False):
+        if rebuild or KubeBaseObj._type_index is None:
+            KubeBaseObj._type_index = KubeTypeIndex()
+        return KubeBaseObj._type_index
+
     @classmethod
     def get_subclasses(cls, non_abstract=True, include_self=False, depth_first=False):
+        subclasses = cls.type_index().subclasses
+        key = (cls, non_abstract, include_self, depth_first)
+        if key not in subclasses:
+            subclasses[key] = tuple(cls._find_subclasses(non_abstract, include_self, depth_first))
+        return list(subclasses[key])
+
+    @classmethod
+    def _find_subclasses(cls, non_abstract=True, include_self=False, depth_first=False):
         def _rec_subclasses(kls):
             ret = []
             subclasses = kls.__subclasses__()
@@ -347,7 +738,7 @@ class KubeBaseObj(object):
                 spc = (7 - len(identifier)) * ' '
             txt += '    {} (identifier): {}{}\n'.format(identifier, spc, types[identifier].name())
 
-        mapping = cls._find_defaults('_map')
+        mapping = cls._get_schema().map
         rmapping = {}
         for d in mapping:
             if mapping[d] not in rmapping:
@@ -371,8 +762,8 @@ class KubeBaseObj(object):
 
     def has_child_object(self, obj):
         assert isinstance(obj, KubeBaseObj)
-        for d in self._data:
-            if obj is self._data[d]:
+        for v in self._data.values():
+            if obj is v:
                 return True
         return False
 
@@ -395,11 +786,16 @@ class KubeBaseObj(object):
                 self.__setattr__(k, kwargs[k])
 
     def validate(self, path=None):
+        # nothing to do if nothing changed since we last passed, failures get checked again for the error
+        state = self.render_state()
+        if state is not None and state == self._valid_state:
+            return True
+
         if path is None:
             path = 'self'
 
         types = self.__class__.resolve_types()
-        mapping = self.__class__._find_defaults('_map')
+        mapping = self.__class__._get_schema().map
 
         if hasattr(self, 'labels'):
             Map(String, String).check(self.labels, '{}.(labels)'.format(path))
@@ -425,10 +821,14 @@ class KubeBaseObj(object):
         sav_data = self._data
         try:
             self._data = data
-            return self.do_validate()
+            ret = self.do_validate()
         finally:
             self._data = sav_data
 
+        if ret:
+            object.__setattr__(self, '_valid_state', state)
+        return ret
+
     def render(self):
         raise NotImplementedError('method not implemented')
 
@@ -451,10 +851,9 @@ class KubeBaseObj(object):
         if kls is not self.__class__:
             return kls().parser(doc)
 
-        mapping = self.__class__._find_defaults('_map')
-        self._data = self.__class__._find_defaults('_defaults')
-        for k in mapping:
-            self._data[k] = None
+        schema = self.__class__._get_schema()
+        mapping = schema.map
+        self._data.reset()
 
         expl = {}
 
@@ -481,8 +880,8 @@ class KubeBaseObj(object):
                 raise UserError(KubeObjParseError('Expected kind - no kind found', self, doc))
 
         types = self.__class__.resolve_types()
-        parser = self.__class__._find_defaults('_parse')
-        exclude = self.__class__._find_defaults('_exclude')
+        parser = dict(schema.parse)
+        exclude = dict(schema.exclude)
 
         if self.has_metadata:
             exclude['.metadata.creationTimestamp'] = True
@@ -587,8 +986,8 @@ class KubeBaseObj(object):
         return self
 
     def dump_obj(self, indent=0, include_defaults=False):
-        defaults = self.__class__._find_defaults('_defaults')
-        mapping = self.__class__._find_defaults('_map')
+        defaults = self.__class__._get_schema().defaults
+        mapping = self.__class__._get_schema().map
 
         def eline(obj, pfx, idt, idt_txt, comma):
             if isinstance(obj, KubeBaseObj):
@@ -682,44 +1081,22 @@ class KubeBaseObj(object):
         return self.__class__.__name__ + '(' + text + args[1] + ')'
 
     def get_obj(self, prop, *args, **kwargs):
-        types = self.__class__.resolve_types()
-
-        mapping = self.__class__._find_defaults('_map')
-        if prop in mapping:
-            prop = mapping[prop]
+        schema = self.__class__._get_schema()
+        if prop in schema.map:
+            prop = schema.map[prop]
 
         fmt = (prop, self.__class__.__name__)
-        if prop not in types:
-            raise KeyError("No such property '{}' on {}".format(*fmt))
-
-        typ = types[prop]
-
-        actual_type = typ.original_type()
-        if actual_type is None:
-            raise UserError(KeyError("Property '{}' can't be auto-constructed in {}".format(*fmt)))
-
-        rtype = None
-        if isinstance(actual_type, list):
-            actual_type = actual_type[0]
-            rtype = 'list'
-        elif isinstance(actual_type, dict):
-            actual_type = actual_type['value']
-            rtype = 'dict'
+        if prop in schema.new_types:
+            actual_type, rtype = schema.new_types[prop]
         else:
-            rtype = 'obj'
-
-        if not isinstance(actual_type, type):
-            raise TypeError("Unexpected type isn't a type is actually a {} for property '{}' in {}".
-                            format(actual_type.__class__.__name__, *fmt))
-
-        if not any(map(lambda x: x is actual_type,
-                       KubeBaseObj.get_subclasses(non_abstract=False, include_self=False))):
-            raise TypeError("Unexpected type {} for property '{}' in {}, must be a subclass of KubeBaseObj".
-                            format(actual_type.__name__, *fmt))
+            actual_type, rtype = schema.new_types[prop] = self.__class__._find_obj_type(prop)
 
         if len(args) > 0 and isinstance(args[0], type):
-            if any(map(lambda x: x is args[0],
-                       actual_type.get_subclasses(non_abstract=True, include_self=True))):
+            index = KubeBaseObj.type_index()
+            if args[0] not in index.concrete[actual_type]:
+                # might be a class made since the index was
+                index = KubeBaseObj.type_index(rebuild=True)
+            if args[0] in index.concrete[actual_type]:
                 actual_type = args[0]
                 args = args[1:]
             else:
@@ -750,50 +1127,88 @@ class KubeBaseObj(object):
         elif rtype == 'dict':
             new = {dkey: result}
 
-        if self._data[prop] is None or rtype == 'obj':
-            self._data[prop] = new
+        current = self._data.own(prop)
+        if current is None or rtype == 'obj':
+            self._data.put(prop, new)
             return result
 
-        if rtype == 'list' and isinstance(self._data[prop], list):
-            self._data[prop].extend(new)
-        elif rtype == 'dict' and isinstance(self._data[prop], dict):
-            self._data[prop].update(new)
+        if rtype == 'list' and isinstance(current, list):
+            current.extend(new)
+        elif rtype == 'dict' and isinstance(current, dict):
+            current.update(new)
         else:
             raise UserError(TypeError("Expecting {} or None for property '{}' on {}".format(rtype, *fmt)))
 
+        self._data.changed()
         return result
 
-    def renderer(self, zlen_ok=(), order=(), mapping=None, return_none=False):
-        ret = copy.deepcopy(self._data)
+    @classmethod
+    def _find_obj_type(cls, prop):
+        types = cls.resolve_types()
+
+        fmt = (prop, cls.__name__)
+        if prop not in types:
+            raise KeyError("No such property '{}' on {}".format(*fmt))
+
+        typ = types[prop]
+
+        actual_type = typ.original_type()
+        if actual_type is None:
+            raise UserError(KeyError("Property '{}' can't be auto-constructed in {}".format(*fmt)))
+
+        rtype = None
+        if isinstance(actual_type, list):
+            actual_type = actual_type[0]
+            rtype = 'list'
+        elif isinstance(actual_type, dict):
+            actual_type = actual_type['value']
+            rtype = 'dict'
+        else:
+            rtype = 'obj'
+
+        if not isinstance(actual_type, type):
+            raise TypeError("Unexpected type isn't a type is actually a {} for property '{}' in {}".
+                            format(actual_type.__class__.__name__, *fmt))
 
+        if actual_type not in KubeBaseObj.type_index().types and \
+                actual_type not in KubeBaseObj.type_index(rebuild=True).types:
+            raise TypeError("Unexpected type {} for property '{}' in {}, must be a subclass of KubeBaseObj".
+                            format(actual_type.__name__, *fmt))
+
+        return (actual_type, rtype)
+
+    def renderer(self, zlen_ok=(), order=(), mapping=None, return_none=False):
+        # built straight from our data: objects get rendered, only other mutable values get copied
         def _render(x):
             if isinstance(x, KubeBaseObj):
                 return x.do_render()
-            return x
+            elif isinstance(x, _immutable_types):
+                return x
+            return copy.deepcopy(x)
 
-        for r in self._data:
-            res = _render(ret[r])
-            if res is None:
-                del ret[r]
-            else:
-                ret[r] = res
-
-        for r in self._data:
-            if r not in ret:
-                continue
-            if isinstance(ret[r], (list, tuple)):
-                ret[r] = list(filter(lambda x: x is not None, map(_render, ret[r])))
-            elif isinstance(ret[r], dict):
+        ret = {}
+        for r, v in self._data.items():
+            if isinstance(v, KubeBaseObj):
+                v = v.do_render()
+                if v is not None:
+                    v = OrderedDict((k, x) for k, x in v.items() if x is not None)
+            elif isinstance(v, (list, tuple)):
+                v = [x for x in map(_render, v) if x is not None]
+            elif isinstance(v, dict):
                 tret = OrderedDict()
-                for k in ret[r]:
-                    res = _render(ret[r][k])
+                for k in v:
+                    res = _render(v[k])
                     if res is not None:
                         tret[k] = res
-                ret[r] = tret
+                v = tret
+            else:
+                v = _render(v)
 
-            if isinstance(ret[r], (list, tuple, dict)):
-                if len(ret[r]) == 0 and r not in zlen_ok:
-                    del ret[r]
+            if v is None:
+                continue
+            if isinstance(v, (list, tuple, dict)) and len(v) == 0 and r not in zlen_ok:
+                continue
+            ret[r] = v
 
         if mapping is not None:
             for k in mapping:
@@ -812,15 +1227,21 @@ class KubeBaseObj(object):
 
     def xform(self):
         ret = {}
-        mapping = self.__class__._find_defaults('_map')
+        schema = self.__class__._get_schema()
+        mapping = schema.map
 
-        for d in self._data:
-            if hasattr(self, 'xf_{}'.format(d)):
-                ret[d] = getattr(self, 'xf_{}'.format(d))(self._data[d])
-            elif d in mapping and hasattr(self, 'xf_{}'.format(mapping[d])):
-                ret[d] = getattr(self, 'xf_{}'.format(mapping[d]))(self._data[d])
-            else:
-                ret[d] = self._data[d]
+        # anything the transforms make is just for this render, so keep it out of the registry
+        KubeBaseObj._transient += 1
+        try:
+            for d, v in self._data.items():
+                if isinstance(v, KubeSharedDefault):
+                    v = v.render_value()
+                if d in schema.xf:
+                    ret[d] = getattr(self, schema.xf[d])(v)
+                else:
+                    ret[d] = v
+        finally:
+            KubeBaseObj._transient -= 1
 
         for d in mapping:
             if d not in ret or ret[d] is None:
@@ -831,14 +1252,49 @@ class KubeBaseObj(object):
 
         return ret
 
+    def render_state(self):
+        """compares equal for as long as do_render() would give the same, None if we can't tell"""
+        if self._always_regenerate or not isinstance(self._data, KubeData) or self._data.version is None:
+            return None
+
+        ret = [id(self), self._data.version]
+        if self.has_metadata:
+            ret.extend((dict(self.labels), dict(self.annotations)))
+        if self._uses_namespace and isinstance(self.namespace, KubeBaseObj) and self.namespace is not self:
+            ret.append(self.namespace.render_state())
+            if ret[-1] is None:
+                return None
+
+        # our own lists and dicts are only changed through us, but not anything inside them
+        def _rec_state(v, inner=False):
+            if isinstance(v, (_immutable_types, KubeSharedDefault)):
+                return True
+            elif isinstance(v, KubeBaseObj):
+                state = v.render_state()
+                if state is None:
+                    return False
+                ret.append(state)
+                return True
+            elif not inner and isinstance(v, (list, tuple)):
+                return all(_rec_state(x, True) for x in v)
+            elif not inner and isinstance(v, dict):
+                return all(_rec_state(x, True) for x in v.values())
+            return False
+
+        if not all(map(_rec_state, self._data.values())):
+            return None
+        return ret
+
     def do_render(self):
         self.validate()
 
         sav_data = self._data
+        KubeBaseObj._transient += 1
         try:
             self._data = self.xform()
             obj = self.render()
         finally:
+            KubeBaseObj._transient -= 1
             self._data = sav_data
 
         if obj is None:
@@ -879,10 +1335,9 @@ class KubeBaseObj(object):
                 if len(self.annotations) != 0:
                     obj['metadata']['annotations'] = copy.copy(self.annotations)
 
-            obj = order_dict(obj, ('metadata', 'spec'))
-
-        if hasattr(self, 'identifier'):
-            obj = order_dict(obj, (self.identifier,))
+        schema = self.__class__._get_schema()
+        if schema.render_order is not None:
+            obj = order_dict(obj, schema.render_order)
 
         ret.update(obj)
         return ret
@@ -890,14 +1345,10 @@ class KubeBaseObj(object):
     def __getattr__(self, k):
         if k != '_data' and hasattr(self, '_data') and k in self._data:
             return self._data[k]
-        if k.startswith('new_') and k[4:] in self._data:
-            def get_prop(*args, **kwargs):
-                return self.get_obj(k[4:], *args, **kwargs)
-            get_prop.__name__ = k
-            return get_prop
-        elif k.startswith('new_') and k[4:] + 's' in self._data:
+        new = self.__class__._get_schema().new
+        if k in new:
             def get_prop(*args, **kwargs):
-                return self.get_obj(k[4:] + 's', *args, **kwargs)
+                return self.get_obj(new[k], *args, **kwargs)
             get_prop.__name__ = k
             return get_prop
         raise KubeAttributeError(AttributeError('No such attribute {} for {}'.format(k, self.__class__.__name__)))
@@ -910,7 +1361,7 @@ class KubeBaseObj(object):
         if k in ('labels', 'annotations', 'namespace'):
             return object.__setattr__(self, k, v)
 
-        fn = traceback.extract_stack(limit=2)[0][0]
+        fn = sys._getframe(1).f_code.co_filename
         for p in user_error_paths:
             if fn.startswith(p + '/'):
                 return object.__setattr__(self, k, v)
@@ -920,7 +1371,7 @@ class KubeBaseObj(object):
     def __getitem__(self, k):
         if not k in self._data:
             raise UserError(KeyError("key {} is not defined for {}".format(k, self.__class__.__name__)))
-        return self._data.__getitem__(k)
+        return self._data[k]
 
     def __setitem__(self, k, v):
         if not k in self._data:
@@ -12,6 +12,8 @@ from kube_types import *
 
 
 class EnvironmentPreProcessMixin(object):
+    __slots__ = ()
+
     def fix_environment(self, env):
         if env is None:
             return env
@@ -45,6 +47,8 @@ class EnvironmentPreProcessMixin(object):
 
 
 class SelectorsPreProcessMixin(object):
+    __slots__ = ()
+
     def fix_selectors(self, sel):
         try:
             Map(String, String).check(sel, None)
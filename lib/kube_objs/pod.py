@@ -6,7 +6,6 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from collections import OrderedDict
-import copy
 
 from kube_obj import KubeBaseObj, KubeSubObj, order_dict
 from kube_types import *
@@ -47,7 +46,7 @@ class ContainerPort(KubeSubObj):
         }
 
     def render(self):
-        ret = copy.deepcopy(self._data)
+        ret = dict(self._data)
         if ret['name'] is None:
             del ret['name']
         if ret['hostPort'] is None:
@@ -79,6 +79,9 @@ class Command(var_types.VarEntity):
         if self._in_validation:
             return "command_output"
 
+        if var_types.VarContext.current_context is not None:
+            var_types.VarContext.current_context['volatile'] = True
+
         env = {}
         if not self.env_clear:
             env.update(os.environ)
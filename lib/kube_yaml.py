@@ -6,6 +6,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 from collections import OrderedDict
+import re
 import sys
 import yaml
 from var_types import VarEntity
@@ -21,18 +22,32 @@ __all__ = ['quoted', 'literal', 'yaml_safe_dump', 'yaml_load']
 # and in particular, allowing us to do proper lazy evaluation of our VarEntities
 
 
-class FakeStringIO(object):
-    def __init__(self, t=''):
-        self.t = t
+class VarEntityStream(object):
+    """write-only stream for the emitter, collecting text chunks (and VarEntities) without concatenating"""
+    def __init__(self):
+        self.text = []
+        self.var = []
+        self.chunks = []
 
     def write(self, text):
-        self.t = self.t + text
+        if isinstance(text, VarEntity):
+            self.text.append(''.join(self.chunks))
+            self.var.append(text)
+            self.chunks = []
+        else:
+            self.chunks.append(text)
 
     def flush(self):
         pass
 
     def get_value(self):
-        return self.t
+        if len(self.var) == 0:
+            return ''.join(self.chunks)
+
+        ret = VarEntity()
+        ret.text = self.text + [''.join(self.chunks)]
+        ret.var = list(self.var)
+        return ret
 
 
 class BlockRepresenter(yaml.representer.BaseRepresenter):
@@ -114,14 +129,18 @@ yaml.add_representer(OrderedDict, ordered_dict_presenter, Dumper=BlockDumper)
 yaml.add_representer(OrderedDict, ordered_dict_presenter, Dumper=SafeDumper)
 
 
-def var_entity_presenter(dumper, data):
+def var_entity_renderer(data):
     def representer(val):
         return yaml.dump(val,
                          indent=data.indent,
                          allow_unicode=True,
                          default_flow_style=False,
                          Dumper=StringDumper)
-    data.renderer = representer
+    return representer
+
+
+def var_entity_presenter(dumper, data):
+    data.renderer = var_entity_renderer(data)
     if hasattr(dumper, 'represent_unicode'):
         return dumper.represent_unicode(data)
     else:
@@ -131,8 +150,292 @@ yaml.add_multi_representer(VarEntity, var_entity_presenter, Dumper=BlockDumper)
 yaml.add_multi_representer(VarEntity, var_entity_presenter, Dumper=SafeDumper)
 
 
+class FastPathUnsupported(Exception):
+    pass
+
+
+class FastEmitter(yaml.emitter.Emitter, yaml.resolver.Resolver):
+    """walks rendered trees (dict/OrderedDict/list/scalars/VarEntity) directly, taking the same
+    decisions as SafeDumper would so the output is byte-identical, raising FastPathUnsupported
+    for anything outside of that (anchors, complex keys, explicit tags, other types)"""
+
+    STR_TAG = 'tag:yaml.org,2002:str'
+    BLOCK_CHARS = '\u000a\u000d\u001c\u001d\u001e\u0085\u2028\u2029'
+    EXTRA_BREAKS = re.compile('[\u0085\u2028\u2029]')
+    SAFE_PLAIN = re.compile('[A-Za-z0-9_/][A-Za-z0-9_./-]*\\Z')
+
+    # text -> (value style, simple key style or None, multiline), shared between dumps
+    style_cache = {}
+    style_cache_max = 100000
+    style_cache_max_len = 1024
+
+    def __init__(self, stream):
+        yaml.emitter.Emitter.__init__(self, stream, allow_unicode=True)
+        yaml.resolver.Resolver.__init__(self)
+        if sys.version_info[0] == 2:
+            self.encoding = 'utf-8'
+        self.seen = set()
+
+    def dump(self, data):
+        if type(data) not in (dict, OrderedDict, list):
+            raise FastPathUnsupported()
+        self.write_stream_start()
+        self.emit_node(data, False)
+        self.write_indent()
+        if self.open_ended:
+            self.write_indicator('...', True)
+            self.write_indent()
+        self.write_stream_end()
+
+    def write_text(self, data):
+        self.column += len(data)
+        if self.encoding:
+            data = data.encode(self.encoding)
+        self.stream.write(data)
+
+    def check_alias(self, data):
+        # pyyaml would emit an anchor and an alias for an object present twice in the tree
+        if id(data) in self.seen:
+            raise FastPathUnsupported()
+        self.seen.add(id(data))
+
+    def emit_node(self, data, mapping):
+        t = type(data)
+        if t is dict or t is OrderedDict:
+            self.check_alias(data)
+            if len(data) == 0:
+                self.emit_empty('{', '}')
+            elif t is dict:
+                try:
+                    keys = sorted(data)
+                except TypeError:
+                    raise FastPathUnsupported()
+                self.emit_mapping([(k, data[k]) for k in keys])
+            else:
+                self.emit_mapping(data.items())
+        elif t is list:
+            self.check_alias(data)
+            if len(data) == 0:
+                self.emit_empty('[', ']')
+            else:
+                self.emit_sequence(data, mapping)
+        elif isinstance(data, VarEntity):
+            self.check_alias(data)
+            self.emit_var_entity(data)
+        else:
+            text, tag = self.scalar_text(data)
+            style, _, multiline = self.scalar_style(text, tag)
+            self.emit_scalar(text, style, multiline, True)
+
+    def emit_empty(self, start, end):
+        self.write_indicator(start, True, whitespace=True)
+        self.write_indicator(end, False)
+
+    def emit_mapping(self, items):
+        self.increase_indent(flow=False)
+        for key, value in items:
+            self.write_indent()
+            style = self.style_cache.get(key) if type(key) is type('') else None
+            if style is not None and style[1] == '':
+                # plain simple key and its ':' indicator in one go
+                self.write_text((key if self.whitespace else ' ' + key) + ':')
+                self.whitespace = False
+                self.indention = False
+                self.open_ended = False
+            else:
+                self.emit_key(key)
+                self.write_indicator(':', False)
+            self.emit_node(value, True)
+        self.indent = self.indents.pop()
+
+    def emit_sequence(self, data, mapping):
+        self.increase_indent(flow=False, indentless=(mapping and not self.indention))
+        for item in data:
+            self.write_indent()
+            self.write_indicator('-', True, indention=True)
+            self.emit_node(item, False)
+        self.indent = self.indents.pop()
+
+    def emit_key(self, key):
+        t = type(key)
+        if sys.version_info[0] == 2 and t is bytes:
+            key, tag = self.scalar_text(key)
+        elif t is not type(''):
+            raise FastPathUnsupported()
+        style = self.scalar_style(key, self.STR_TAG)[1]
+        if style is None:
+            raise FastPathUnsupported()
+        self.emit_scalar(key, style, False, False)
+
+    def emit_var_entity(self, data):
+        indent = self.indent
+        self.indent = self.best_indent if indent is None else indent + self.best_indent
+        data.renderer = var_entity_renderer(data)
+        data.indent = self.indent
+        value = ''
+        if not self.whitespace:
+            value = ' '
+            self.column += 1
+        value = value + data
+        self.column += 1
+        self.stream.write(value)
+        self.whitespace = False
+        self.indent = indent
+
+    def scalar_text(self, data):
+        t = type(data)
+        if t is type(''):
+            return data, self.STR_TAG
+        if t is bool:
+            return 'true' if data else 'false', 'tag:yaml.org,2002:bool'
+        if data is None:
+            return 'null', 'tag:yaml.org,2002:null'
+        if t is float:
+            return self.float_text(data), 'tag:yaml.org,2002:float'
+        if sys.version_info[0] == 2:
+            if t is bytes:
+                try:
+                    return data.decode('ascii'), self.STR_TAG
+                except UnicodeDecodeError:
+                    try:
+                        return data.decode('utf-8'), self.STR_TAG
+                    except UnicodeDecodeError:
+                        raise FastPathUnsupported()
+            if t is int or t is long:
+                return type('')(data), 'tag:yaml.org,2002:int'
+        elif t is int:
+            return type('')(data), 'tag:yaml.org,2002:int'
+        raise FastPathUnsupported()
+
+    def float_text(self, data):
+        if data != data or (data == 0.0 and data == 1.0):
+            return '.nan'
+        elif data == yaml.representer.SafeRepresenter.inf_value:
+            return '.inf'
+        elif data == -yaml.representer.SafeRepresenter.inf_value:
+            return '-.inf'
+        value = type('')(repr(data)).lower()
+        if '.' not in value and 'e' in value:
+            value = value.replace('e', '.0e', 1)
+        return value
+
+    def scalar_style(self, text, tag):
+        key = text if tag == self.STR_TAG else (tag, text)
+        try:
+            return self.style_cache[key]
+        except KeyError:
+            pass
+
+        if self.SAFE_PLAIN.match(text):
+            empty = multiline = False
+            allow_block_plain = allow_single_quoted = allow_block = True
+        else:
+            analysis = self.analyze_scalar(text)
+            empty = analysis.empty
+            multiline = analysis.multiline
+            allow_block_plain = analysis.allow_block_plain
+            allow_single_quoted = analysis.allow_single_quoted
+            allow_block = analysis.allow_block
+
+        block = False
+        if tag == self.STR_TAG:
+            for c in self.BLOCK_CHARS:
+                if c in text:
+                    block = True
+                    break
+        implicit = self.resolve(yaml.nodes.ScalarNode, text, (True, False)) == tag
+
+        def choose(simple_key):
+            if not block and implicit:
+                if not (simple_key and (empty or multiline)) and allow_block_plain:
+                    return ''
+            if block and not simple_key and allow_block:
+                return '|'
+            if not block and allow_single_quoted and not (simple_key and multiline):
+                return '\''
+            return '"'
+
+        value_style = choose(False)
+        if tag != self.STR_TAG and not (value_style == '' and implicit):
+            # would need an explicit tag
+            raise FastPathUnsupported()
+        key_style = None
+        if not empty and not multiline and len(text) + len('!!str') < 128:
+            key_style = choose(True)
+
+        ret = (value_style, key_style, multiline)
+        if len(text) <= self.style_cache_max_len:
+            if len(self.style_cache) >= self.style_cache_max:
+                self.style_cache.clear()
+            self.style_cache[key] = ret
+        return ret
+
+    def emit_scalar(self, text, style, multiline, split):
+        indent = self.indent
+        self.indent = self.best_indent if indent is None else indent + self.best_indent
+        if style == '':
+            if not text:
+                pass
+            elif not split or ' ' not in text or \
+                    self.column + len(text) + (0 if self.whitespace else 1) <= self.best_width:
+                self.write_text(text if self.whitespace else ' ' + text)
+                self.whitespace = False
+                self.indention = False
+            else:
+                self.write_plain(text, split)
+        elif style == '\'':
+            data = ('\'' if self.whitespace else ' \'') + text.replace('\'', '\'\'') + '\''
+            if not multiline and (not split or self.column + len(data) <= self.best_width):
+                self.write_text(data)
+                self.whitespace = False
+                self.indention = False
+                self.open_ended = False
+            else:
+                self.write_single_quoted(text, split)
+        elif style == '|':
+            if self.EXTRA_BREAKS.search(text):
+                self.write_literal(text)
+            else:
+                self.write_literal_lines(text)
+        else:
+            self.write_double_quoted(text, split)
+        self.indent = indent
+
+    def write_literal_lines(self, text):
+        hints = self.determine_block_hints(text)
+        self.write_indicator('|' + hints, True)
+        if hints[-1:] == '+':
+            self.open_ended = True
+        self.write_line_break()
+        pad = ' ' * self.indent
+        data = '\n'.join(pad + line if line else '' for line in text.split('\n'))
+        if not text.endswith('\n'):
+            data += '\n'
+        if self.encoding:
+            data = data.encode(self.encoding)
+        self.stream.write(data)
+        self.whitespace = True
+        self.indention = True
+        self.column = 0
+
+
+def fast_yaml_safe_dump(data):
+    stream = VarEntityStream()
+    FastEmitter(stream).dump(data)
+    return stream.get_value()
+
+
 def yaml_safe_dump(*args, **kwargs):
-    stream = FakeStringIO()
+    if len(args) == 1 and all(k == 'default_flow_style' for k in kwargs):
+        try:
+            return fast_yaml_safe_dump(args[0])
+        except FastPathUnsupported:
+            pass
+    return pyyaml_safe_dump(*args, **kwargs)
+
+
+def pyyaml_safe_dump(*args, **kwargs):
+    stream = VarEntityStream()
     kwargs['stream'] = stream
     kwargs['default_flow_style'] = False
     kwargs['allow_unicode'] = True
@@ -142,7 +445,7 @@ def yaml_safe_dump(*args, **kwargs):
 
 
 def yaml_dump(*args, **kwargs):
-    stream = FakeStringIO()
+    stream = VarEntityStream()
     kwargs['stream'] = stream
     kwargs['default_flow_style'] = False
     kwargs['allow_unicode'] = True
@@ -151,7 +454,20 @@ def yaml_dump(*args, **kwargs):
     return stream.get_value()
 
 
+def find_loader():
+    # the C bindings are only used if the _yaml extension actually imports and works with this yaml
+    if getattr(yaml, '__with_libyaml__', False):
+        try:
+            if yaml.load(StringIO('a: [1, b]'), Loader=yaml.CSafeLoader) == {'a': [1, 'b']}:
+                return yaml.CSafeLoader
+        except Exception:
+            pass
+    return yaml.SafeLoader
+
+Loader = find_loader()
+
+
 def yaml_load(string):
     if sys.version_info[0] == 2:
         string = unicode(string)
-    return yaml.load(StringIO(string))
+    return yaml.load(StringIO(string), Loader=Loader)
@@ -5,21 +5,25 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import gc
 import json
 import os
 import sys
+import time
 import weakref
 
 import loader
 
 import kube_yaml
-from load_python_core import do_compile_internal
+from load_python_core import do_compile_internal, list_dir
+from code_cache import CodeCache
 from kube_obj import KubeObj, KubeBaseObj
 from obj_registry import obj_registry
 from user_error import UserError, user_originated
-from output import RubiksOutputError, OutputCollection
+from output import RubiksOutputError, OutputCollection, PrerenderedOutputMember, IncrementalFallback
+from incremental import IncrementalState
 from lookup import Resolver
-from util import mkdir_p
+from util import mkdir_p, fork_context, run_parallel
 
 import kube_objs
 import kube_vartypes
@@ -59,6 +63,19 @@ class PythonFileCollection(loader.Loader):
     def __init__(self, repository):
         loader.Loader.__init__(self, repository)
         self.outputs = OutputCollection(self, repository)
+        if getattr(repository, 'cache', None):
+            self.code_cache = CodeCache(os.path.join(repository.basepath, repository.cache))
+        else:
+            self.code_cache = CodeCache()
+        self.compiling = []
+        self.inputs = {}
+        self.conflicts = []
+        self.planned = None
+        self.reused_files = {}
+        self.object_files = set()
+        self.only_cluster = None
+        self.runs = set()
+        self.object_runs = set()
 
     def get_file_context(self, path):
         if path.extension is None:
@@ -73,38 +90,402 @@ class PythonFileCollection(loader.Loader):
 
         return self.get_or_add_file(path, python_loader, (self, path))
 
-    def load_all_python(self, basepath):
+    def find_python(self, basepath):
         extensions = self.__class__.get_python_file_type(None)
         good_ext = set()
         for ext in extensions:
             if extensions[ext].default_export_objects:
                 good_ext.add(ext)
 
+        srcdir = os.path.join(self.repository.basepath, basepath)
+        listing = self.load_listing(good_ext)
+        new_listing = {}
+        recent = time.time() - 2
         paths = []
 
+        def _list(path):
+            if listing is None:
+                return list_dir(os.path.join(srcdir, path))
+
+            # the directory only changes mtime when something is added, removed or renamed in it
+            mtime = os.stat(os.path.join(srcdir, path)).st_mtime
+            if path in listing and listing[path]['mtime'] == mtime:
+                ents = listing[path]['entries']
+            else:
+                ents = []
+                for d_ent, is_dir, is_link in list_dir(os.path.join(srcdir, path)):
+                    if d_ent.startswith('.'):
+                        continue
+                    if is_dir or is_link or ('.' in d_ent and d_ent.rsplit('.', 1)[1] in good_ext):
+                        ents.append([d_ent, is_dir, is_link])
+            if mtime < recent:
+                new_listing[path] = {'mtime': mtime, 'entries': ents}
+            return ents
+
         def _rec_add(path):
-            d_ents = os.listdir(os.path.join(self.repository.basepath, basepath, path, '.'))
-            for d_ent in sorted(d_ents):
+            for d_ent, is_dir, is_link in _list(path):
                 if d_ent.startswith('.'):
                     continue
-                if os.path.exists(os.path.join(self.repository.basepath, basepath, path, d_ent, '.')):
+                if is_dir:
                     if path == '.':
                         _rec_add(d_ent)
                     else:
                         _rec_add(os.path.join(path, d_ent))
                     continue
-                pth = loader.Path(os.path.join(self.repository.basepath, basepath, path, d_ent), self.repository)
-                if pth.extension is None:
+                # a symlink goes by the extension of what it points to
+                if not is_link and ('.' not in d_ent or d_ent.rsplit('.', 1)[1] not in good_ext):
                     continue
+                pth = loader.Path(os.path.join(srcdir, path, d_ent), self.repository)
                 if pth.extension not in good_ext:
                     continue
                 paths.append(pth)
 
         _rec_add('.')
+        if listing is not None and new_listing != listing:
+            self.save_listing(good_ext, new_listing)
+        return paths
+
+    def listing_file(self):
+        if not getattr(self.repository, 'cache', None):
+            return None
+        return os.path.join(self.repository.basepath, self.repository.cache, 'sources.json')
+
+    def load_listing(self, extensions):
+        filename = self.listing_file()
+        if filename is None:
+            return None
+        try:
+            with open(filename) as f:
+                listing = json.load(f)
+            if listing['version'] == 2 and listing['extensions'] == sorted(extensions):
+                return listing['dirs']
+        except (IOError, OSError, TypeError, ValueError, KeyError):
+            pass
+        return {}
+
+    def save_listing(self, extensions, dirs):
+        filename = self.listing_file()
+        # per process, two runs in the same repository mustn't write over each other's
+        tmpname = '{}.{}.tmp'.format(filename, os.getpid())
+        mkdir_p(os.path.dirname(filename))
+        with open(tmpname, 'w') as f:
+            json.dump({'version': 2, 'extensions': sorted(extensions), 'dirs': dirs}, f, sort_keys=True)
+        os.rename(tmpname, filename)
+
+    def load_all_python(self, basepath, jobs=1):
+        paths = self.find_python(basepath)
+        if jobs > 1 and len(paths) > 1 and self.load_parallel(paths, jobs):
+            return
 
         for p in paths:
             self.load_python(p)
 
+        if jobs > 1:
+            self.save_graph()
+
+    def graph_file(self):
+        if not getattr(self.repository, 'cache', None):
+            return None
+        return os.path.join(self.repository.basepath, self.repository.cache, 'graph.json')
+
+    def load_graph(self):
+        try:
+            with open(self.graph_file()) as f:
+                return json.load(f)
+        except (IOError, OSError, TypeError, ValueError):
+            return {}
+
+    def save_graph(self):
+        filename = self.graph_file()
+        if filename is None:
+            return
+        graph = dict((f, {'deps': sorted(self.deps[f]), 'objects': f in self.object_files}) for f in self.deps)
+        # per process, two runs in the same repository mustn't write over each other's
+        tmpname = '{}.{}.tmp'.format(filename, os.getpid())
+        mkdir_p(os.path.dirname(filename))
+        try:
+            with open(tmpname, 'w') as f:
+                json.dump(graph, f, sort_keys=True)
+            os.rename(tmpname, filename)
+        except (IOError, OSError):
+            try:
+                os.unlink(tmpname)
+            except OSError:
+                pass
+            raise
+
+    def partition(self, paths, jobs):
+        # sources sharing an import which creates objects have to run in the same process
+        graph = self.load_graph()
+        tops = [p.src_rel_path for p in paths]
+        group = dict((t, t) for t in tops)
+        owner = dict((t, t) for t in tops)
+
+        def _find(t):
+            while group[t] != t:
+                t = group[t]
+            return t
+
+        for t in tops:
+            seen = set()
+            todo = [t]
+            while len(todo) != 0:
+                f = todo.pop()
+                if f in seen or f not in graph:
+                    continue
+                seen.add(f)
+                if f != t and graph[f]['objects']:
+                    if f in owner:
+                        a, b = _find(t), _find(owner[f])
+                        if a != b:
+                            group[a] = b
+                    else:
+                        owner[f] = t
+                todo.extend(graph[f]['deps'])
+
+        components = []
+        index = {}
+        for p in paths:
+            g = _find(p.src_rel_path)
+            if g not in index:
+                index[g] = len(components)
+                components.append([])
+            components[index[g]].append(p)
+
+        # per-cluster sources which don't share objects with anything can also be split by cluster
+        clusters = self.repository.get_clusters()
+
+        def _per_cluster(comp):
+            if len(clusters) == 0:
+                return False
+            for p in comp:
+                if not issubclass(self.get_python_file_type(p.extension), PythonImportPerClusterFile):
+                    return False
+            reached = set()
+            todo = [p.src_rel_path for p in comp]
+            while len(todo) != 0:
+                f = todo.pop()
+                if f in reached or f not in graph:
+                    continue
+                reached.add(f)
+                todo.extend(graph[f]['deps'])
+            return not any(graph[f]['objects'] for f in reached if f not in tops)
+
+        split = [c for c in components if _per_cluster(c)]
+        components = [c for c in components if not _per_cluster(c)]
+
+        units = [(None, []) for _ in range(min(len(components), jobs * 4))]
+        for i, c in enumerate(components):
+            units[i % len(units)][1].extend(c)
+        if len(split) != 0:
+            units.extend((cl, sum(split, [])) for cl in clusters)
+        for u in units:
+            u[1].sort(key=lambda p: tops.index(p.src_rel_path))
+        return units
+
+    def _load_partition(self, unit):
+        self.only_cluster, paths = unit
+        try:
+            for p in paths:
+                self.load_python(p)
+            return {
+                'outputs': self.outputs.save_all(),
+                'deps': dict((f, sorted(self.deps[f])) for f in self.deps),
+                'objects': sorted(self.object_files),
+                'runs': sorted(self.runs),
+                'object_runs': sorted(self.object_runs),
+                }
+        except Exception as e:
+            return {'error': '{}: {}'.format(e.__class__.__name__, e)}
+
+    def partition_clashes(self, units, results):
+        """(merged outputs, []) or (None, groups of partitions which ran the same object-creating source or
+        output the same thing)"""
+        group = list(range(len(units)))
+
+        def _find(i):
+            while group[i] != i:
+                i = group[i]
+            return i
+
+        def _join(owners):
+            for i in owners[1:]:
+                a, b = _find(owners[0]), _find(i)
+                if a != b:
+                    group[b] = a
+
+        def _groups():
+            groups = {}
+            for i in range(len(units)):
+                groups.setdefault(_find(i), []).append(i)
+            return [groups[g] for g in sorted(groups) if len(groups[g]) > 1]
+
+        ran = {}
+        object_runs = set()
+        for i, r in enumerate(results):
+            object_runs.update(r['object_runs'])
+            for run in r['runs']:
+                ran.setdefault(run, []).append(i)
+        for run in sorted(ran):
+            if len(ran[run]) > 1 and run in object_runs:
+                self.debug(1, '{} was run by more than one partition'.format(run[0]))
+                _join(ran[run])
+
+        if len(_groups()) == 0:
+            outputs = OutputCollection(self, self.repository)
+            output_by = {}
+            for i, r in enumerate(results):
+                for saved in r['outputs']:
+                    output_by.setdefault(saved['identifier'], []).append(i)
+            for r in results:
+                for saved in r['outputs']:
+                    if not outputs.merge_prerendered(PrerenderedOutputMember(outputs, saved)):
+                        self.debug(1, '{} was output by more than one partition'.format(saved['identifier']))
+                        _join(output_by[saved['identifier']])
+            if len(_groups()) == 0:
+                return (outputs, [])
+
+        # the per-cluster partitions all run the same sources, so they go together or not at all
+        clustered = [i for i in range(len(units)) if units[i][0] is not None]
+        if any(i in clustered for g in _groups() for i in g):
+            _join(clustered)
+        return (None, _groups())
+
+    def load_parallel(self, paths, jobs):
+        if fork_context() is None:
+            # each partition needs a process of its own
+            self.debug(1, "can't fork processes here, loading serially")
+            return False
+
+        units = self.partition(paths, jobs)
+        self.debug(1, 'loading {} files in {} partitions with {} jobs'.format(len(paths), len(units), jobs))
+        results = run_parallel(self._load_partition, units, jobs, fresh=True)
+
+        while True:
+            errors = [r['error'] for r in results if 'error' in r]
+            if len(errors) != 0:
+                self.debug(1, 'parallel load failed ({}), loading serially'.format(errors[0]))
+                return False
+
+            outputs, clashes = self.partition_clashes(units, results)
+            if outputs is not None:
+                break
+
+            # only the partitions which clashed are run again, together this time
+            merged = []
+            for group in clashes:
+                todo = set(p for i in group for p in units[i][1])
+                merged.append((None, [p for p in paths if p in todo]))
+            kept = [i for i in range(len(units)) if not any(i in group for group in clashes)]
+            self.debug(1, 'running {} partitions again as {}'.format(len(units) - len(kept), len(merged)))
+            units = [units[i] for i in kept] + merged
+            results = [results[i] for i in kept] + run_parallel(self._load_partition, merged, jobs, fresh=True)
+
+        self.outputs = outputs
+        for r in results:
+            self.object_files.update(r['objects'])
+            for f in r['deps']:
+                self.deps.setdefault(f, set()).update(r['deps'][f])
+        self.save_graph()
+        return True
+
+    def state_file(self):
+        if not getattr(self.repository, 'cache', None):
+            raise UserError(RubiksOutputError("incremental generation needs a cache directory in .rubiks"))
+        return os.path.join(self.repository.basepath, self.repository.cache, 'generate.json')
+
+    def load_incremental(self, basepath):
+        paths = self.find_python(basepath)
+        state = IncrementalState(self.repository, self.state_file())
+        plan = state.plan([p.src_rel_path for p in paths]) if state.load() else None
+
+        if plan is None:
+            self.debug(1, 'no usable state from a previous incremental run, loading everything')
+            for p in paths:
+                self.load_python(p)
+            return
+
+        to_load, self.planned, reused = plan
+        self.debug(1, 'incremental: running {} of {} files, reusing {} outputs'.format(
+            len(to_load), len(paths), len(reused)))
+        self.reused_files = state.files
+        for saved in reused:
+            self.outputs.add_prerendered(PrerenderedOutputMember(self.outputs, saved))
+
+        for p in paths:
+            if p.src_rel_path in to_load:
+                self.load_python(p)
+
+        for op in self.outputs.all_members():
+            reused = op if isinstance(op, PrerenderedOutputMember) else op.reused
+            if reused is not None:
+                unplanned = [s for s in reused.sources if s in self.deps and s not in self.planned]
+                if len(unplanned) != 0:
+                    self.incremental_conflict('{} was also run for {}'.format(', '.join(unplanned), op.identifier))
+
+        if len(self.conflicts) != 0:
+            raise IncrementalFallback(self.conflicts[0])
+
+    def save_state(self):
+        state = IncrementalState(self.repository, self.state_file())
+        previous = self.reused_files
+
+        volatile = set(f.path.src_rel_path for f in self.files.values() if f.volatile)
+        outputs = []
+        for op in self.outputs.all_members():
+            saved = op.save()
+            if op.is_volatile or op.is_confidential:
+                volatile.update(op.sources)
+            if op.is_confidential:
+                # never kept in the cache, the sources making it are run every time instead
+                saved['content'] = None
+            outputs.append(saved)
+
+        files = {}
+        for f in self.deps:
+            files[f] = state.file_entry(f, self.deps[f], self.inputs.get(f, ()), f in volatile)
+
+        # files not run this time, but still used by what was
+        needed = set()
+        for op in outputs:
+            needed.update(op['sources'])
+        for f in files:
+            needed.update(files[f]['deps'])
+        while len(needed) != 0:
+            f = needed.pop()
+            if f in files or f not in previous:
+                continue
+            files[f] = previous[f]
+            needed.update(files[f]['deps'])
+
+        state.save(files, outputs)
+
+    def unload_pythonpath_modules(self):
+        dirs = [os.path.join(os.path.realpath(p), '') for p in self.repository.pythonpath]
+        for name, mod in list(sys.modules.items()):
+            fn = getattr(mod, '__file__', None)
+            if fn is not None and any(os.path.realpath(fn).startswith(d) for d in dirs):
+                del sys.modules[name]
+
+    def release_modules(self):
+        # once everything is loaded nothing can import them any more, the outputs hold what they need
+        for f in self.files.values():
+            f.module = None
+        gc.collect()
+
+    def compiling_file(self):
+        if len(self.compiling) == 0:
+            return None
+        return self.compiling[-1]
+
+    def incremental_conflict(self, reason):
+        self.conflicts.append(reason)
+
+    def add_input(self, py_context, path):
+        if py_context.path.src_rel_path not in self.inputs:
+            self.inputs[py_context.path.src_rel_path] = set()
+        self.inputs[py_context.path.src_rel_path].add(path.repo_rel_path)
+
     def load_python(self, path):
         if isinstance(path, loader.Path):
             pth = path
@@ -127,6 +508,8 @@ class PythonFileCollection(loader.Loader):
 
         new_context = None
         try:
+            # before running it, so that a loop is caught rather than recursed into
+            self.add_dep(py_context.path, path)
             new_context = self.get_file_context(path)
 
             if 'no_import' not in kwargs or not kwargs['no_import']:
@@ -144,14 +527,15 @@ class PythonFileCollection(loader.Loader):
         except loader.LoaderBaseException as e:
             raise UserError(e)
 
-        self.add_dep(py_context.path, path)
         return new_context
 
     def add_output(self, kobj):
         self.outputs.add_output(kobj)
 
-    def gen_output(self):
-        self.outputs.write_output()
+    def gen_output(self, jobs=1, low_memory=False):
+        if low_memory:
+            self.release_modules()
+        self.outputs.write_output(jobs, low_memory)
 
 
 class PythonBaseFile(object):
@@ -203,6 +587,7 @@ class PythonBaseFile(object):
 
         self.output_was_called = False
         self.default_import_args = {}
+        self.volatile = False
 
         if self.compile_in_init:
             save_cluster = KubeBaseObj._default_cluster
@@ -284,11 +669,13 @@ class PythonBaseFile(object):
         @_user_error
         def get_lookup(path, **kwargs):
             path = self.path.rel_path(path)
+            self.collection().add_input(self, path)
             return Resolver(path, **kwargs)
 
         @_user_error
         def read_file(path, cant_read_ok=False):
             path = self.path.rel_path(path)
+            self.collection().add_input(self, path)
             try:
                 with open(path.full_path) as f:
                     return f.read()
@@ -320,9 +707,11 @@ class PythonBaseFile(object):
             if args['delay']:
                 return cmd_ent
             else:
+                self.volatile = True
                 return str(cmd_ent)
 
         def fileinfo():
+            self.volatile = True
             return {
                 'current_file_full_path': self.path.full_path,
                 'current_file_repo_path': self.path.repo_rel_path,
@@ -424,18 +813,20 @@ class PythonBaseFile(object):
             with open(self.path.full_path) as f:
                 src = f.read()
 
+            compiled = self.collection().code_cache.compile(src, os.path.relpath(self.path.full_path))
+
             ctx = self.default_ns()
             if extra_context is not None:
                 ctx.update(extra_context)
 
             obj_registry().new_context(id(self))
+            self.collection().compiling.append(self.path.src_rel_path)
             finished_ok = False
             try:
                 o_exc = None
                 try:
                     mod = do_compile_internal(
-                        self, src,
-                        os.path.relpath(self.path.full_path),
+                        self, compiled,
                         self.path.dot_path(), self.path.full_path, ctx, (PythonStopCompile,))
                 except UserError as e:
                     o_exc = sys.exc_info()
@@ -454,16 +845,24 @@ class PythonBaseFile(object):
                 finished_ok = True
             finally:
                 objs = obj_registry().close_context(id(self))
-                if finished_ok and not self.output_was_called and self.default_export_objects:
-                    for o in objs:
-                        if isinstance(o, KubeObj) and o._data[o.identifier] is not None:
-                            try:
-                                self.collection().add_output(o)
-                            except UserError as e:
-                                e.f_file = o._caller_file
-                                e.f_line = o._caller_line
-                                e.f_fn = o._caller_fn
-                                raise e
+                run = (self.path.src_rel_path, (extra_context or {}).get('current_cluster_name', None))
+                self.collection().runs.add(run)
+                if len(objs) != 0:
+                    self.collection().object_files.add(self.path.src_rel_path)
+                    self.collection().object_runs.add(run)
+                try:
+                    if finished_ok and not self.output_was_called and self.default_export_objects:
+                        for o in objs:
+                            if isinstance(o, KubeObj) and o._data[o.identifier] is not None:
+                                try:
+                                    self.collection().add_output(o)
+                                except UserError as e:
+                                    e.f_file = o._caller_file
+                                    e.f_line = o._caller_line
+                                    e.f_fn = o._caller_fn
+                                    raise e
+                finally:
+                    self.collection().compiling.pop()
         except SyntaxError:
             raise
         except UserError:
@@ -514,6 +913,8 @@ class PythonImportPerClusterFile(PythonBaseFile):
             self.fallback = False
             self.module = {}
             for c in self.collection().repository.get_clusters():
+                if self.collection().only_cluster not in (None, c):
+                    continue
                 this_cluster = self.collection().repository.get_cluster_info(c)
                 save_cluster = KubeBaseObj._default_cluster
                 res_save_cluster = Resolver.current_cluster
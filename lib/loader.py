@@ -44,12 +44,31 @@ class LoaderImportError(LoaderBaseException):
 
 
 class Path(object):
-    def __init__(self, path, repository):
+    """a file in the repository - read-only, and the same object for the same file (per repository)"""
+    def __new__(cls, path, repository):
+        # kept on the repository (which each path refers to), so they go away together
+        paths = getattr(repository, '_paths', None)
+        if paths is None:
+            paths = repository._paths = {}
+        try:
+            return paths[path]
+        except KeyError:
+            pass
+
+        full_path = os.path.realpath(path)
+        if full_path not in paths:
+            self = object.__new__(cls)
+            self.setup(full_path, repository)
+            paths[full_path] = self
+        paths[path] = paths[full_path]
+        return paths[path]
+
+    def setup(self, full_path, repository):
         self.repository = repository
         self.rootdir = repository.basepath
         self.srcsdir = os.path.join(repository.basepath, repository.sources)
 
-        self.full_path = os.path.realpath(path)
+        self.full_path = full_path
         self.repo_rel_path = os.path.relpath(self.full_path, self.rootdir)
         self.src_rel_path = os.path.relpath(self.full_path, self.srcsdir)
         if not self.in_sources():
@@ -67,11 +86,19 @@ class Path(object):
             self.basename = self.filename
             self.extension = None
 
+        self._dot_path = '.'.join(self.src_rel_dir.split(os.path.sep)) + '.' + self.basename
+        self.read_only = True
+
+    def __setattr__(self, k, v):
+        if not hasattr(self, 'read_only') or not self.read_only:
+            return object.__setattr__(self, k, v)
+        raise AttributeError("Path object is read-only")
+
     def in_sources(self):
         return not self.src_rel_path.startswith('..')
 
     def dot_path(self):
-        return '.'.join(self.src_rel_dir.split(os.path.sep)) + '.' + self.basename
+        return self._dot_path
 
     def rel_path(self, path):
         assert not path.startswith('/')
@@ -84,7 +111,22 @@ class Path(object):
         return os.path.exists(self.full_path)
 
     def __eq__(self, other):
-        return self.__class__ == other.__class__ and self.full_path == other.full_path
+        return self is other or (self.__class__ == other.__class__ and self.full_path == other.full_path)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.full_path)
+
+    def __reduce__(self):
+        return (self.__class__, (self.full_path, self.repository))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __repr__(self):
         return '<{}: {}>'.format(self.__class__.__name__, self.full_path)
@@ -192,10 +234,10 @@ class Loader(object):
     def add_dep(self, s_path, d_path=None):
         if s_path.src_rel_path not in self.deps:
             self.deps[s_path.src_rel_path] = set()
-        if d_path is not None:
+        if d_path is not None and d_path.src_rel_path not in self.deps[s_path.src_rel_path]:
             self.debug(2, '{} depends on {}'.format(s_path, d_path))
+            self.check_dep(s_path.src_rel_path, d_path.src_rel_path)
             self.deps[s_path.src_rel_path].add(d_path.src_rel_path)
-            self.check_deps()
 
     def get_or_add_file(self, f_path, comp_context_obj, args):
         if f_path.full_path in self.files:
@@ -208,20 +250,23 @@ class Loader(object):
         self.files[f_path.full_path] = comp_context
         return comp_context
 
-    def check_deps(self):
-        checked = set()
-
-        def _rec_check_deps(k, prev):
-            if prev is None:
-                prev = set()
-            for nk in self.deps[k]:
-                if nk in prev:
-                    raise LoaderLoopException('Loop detected: {} imports {}'.format(nk, k))
-                nprev = set((nk,))
-                nprev.update(prev)
-                _rec_check_deps(nk, nprev)
-                checked.add(nk)
-
-        for k in self.deps:
-            if k not in checked:
-                _rec_check_deps(k, None)
+    def check_dep(self, s, d):
+        # the graph has no loops yet, so s -> d only makes one if s is reachable from d
+        prev = {d: None}
+        todo = [d]
+        while len(todo) != 0 and s not in prev:
+            k = todo.pop()
+            for nk in self.deps.get(k, ()):
+                if nk not in prev:
+                    prev[nk] = k
+                    todo.append(nk)
+
+        if s not in prev:
+            return
+
+        loop = [s]
+        while loop[-1] != d:
+            loop.append(prev[loop[-1]])
+        loop.reverse()
+        loop.insert(0, s)
+        raise LoaderLoopException('Loop detected: {}'.format(' imports '.join(loop)))
@@ -5,6 +5,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import weakref
+
 from user_error import UserError
 from kube_obj import KubeBaseObj, KubeObj
 from kube_objs.namespace import Namespace
@@ -16,10 +18,19 @@ class RegistryStackError(Exception):
     pass
 
 
+def _deref(r):
+    if isinstance(r, weakref.ref):
+        return r()
+    return r
+
+
 class ObjectRegistry(object):
-    def __init__(self):
+    def __init__(self, weak=False):
+        # weak: only namespaces (which get_ns looks up by name) are kept alive by the registry
+        self.weak = weak
         self.registry = {}
         self.id_registry = {}
+        self.parent_registry = weakref.WeakKeyDictionary() if weak else {}
         self.classes = {}
         self.context_stack = []
 
@@ -27,11 +38,57 @@ class ObjectRegistry(object):
         cls = obj.__class__
         clsname = self.get_class_name(cls)
         if clsname not in self.registry:
-            self.registry[clsname] = {}
+            if self.is_weak(obj):
+                self.registry[clsname] = weakref.WeakValueDictionary()
+            else:
+                self.registry[clsname] = {}
         if len(self.context_stack) != 0:
             self.context_stack[-1][1].append(obj)
         self.registry[clsname][id(obj)] = obj
 
+        # from now on the object tells us about every field it's given (see field_changed)
+        obj._data.owner = obj
+        for k, v in obj._data.items():
+            if isinstance(v, KubeBaseObj) or (k == obj._data.schema.identifier and v is not None):
+                self.field_changed(obj, k, None, v)
+
+    def is_weak(self, obj):
+        return self.weak and not isinstance(obj, Namespace)
+
+    def ref(self, obj):
+        if self.is_weak(obj):
+            return weakref.ref(obj)
+        return obj
+
+    def field_changed(self, obj, k, old, new):
+        if old is new:
+            return
+
+        if k == obj._data.schema.identifier:
+            ids = self.id_registry.setdefault(self.get_class_name(obj.__class__), {})
+            try:
+                if old is not None:
+                    ids[old].remove(self.ref(obj))
+                    if len(ids[old]) == 0:
+                        del ids[old]
+            except (KeyError, TypeError):
+                pass
+            try:
+                if new is not None:
+                    ids.setdefault(new, []).append(self.ref(obj))
+            except TypeError:
+                # can't be looked up by get_id anyway
+                pass
+
+        if isinstance(old, KubeBaseObj) and old in self.parent_registry:
+            self.parent_registry[old].remove(self.ref(obj))
+            if len(self.parent_registry[old]) == 0:
+                del self.parent_registry[old]
+        if isinstance(new, KubeBaseObj):
+            if new not in self.parent_registry:
+                self.parent_registry[new] = []
+            self.parent_registry[new].append(self.ref(obj))
+
     def new_context(self, identifier):
         self.context_stack.append((identifier, []))
 
@@ -65,37 +122,23 @@ class ObjectRegistry(object):
         if not hasattr(cls, 'identifier'):
             return None
 
-        id_fld = cls.identifier
-        clsname = self.get_class_name(cls)
-
-        if clsname not in self.registry:
-            return None
-
-        if clsname in self.id_registry and identifier in self.id_registry[clsname]:
-            return self.id_registry[clsname][identifier]
-        elif clsname not in self.id_registry:
-            self.id_registry[clsname] = {}
-
-        ret = []
-        self.id_registry[clsname] = {}
-        for obj in self.registry[clsname].values():
-            if hasattr(obj, id_fld) and getattr(obj, id_fld) is not None:
-                curr_id = getattr(obj, id_fld)
-                if curr_id not in self.id_registry[clsname]:
-                    self.id_registry[clsname][curr_id] = []
-                self.id_registry[clsname][curr_id].append(obj)
-                if curr_id == identifier:
-                    ret.append(obj)
-
-        if len(ret) == 0:
+        ids = self.id_registry.get(self.get_class_name(cls), {})
+        ret = ids.get(identifier)
+        if ret is None:
             return None
-        return ret
+        if self.weak:
+            ret[:] = [r for r in ret if _deref(r) is not None]
+            if len(ret) == 0:
+                del ids[identifier]
+                return None
+        return [_deref(r) for r in ret]
 
     def get_parents(self, obj):
+        parents = [_deref(r) for r in self.parent_registry.get(obj, ())]
         ret = []
-        for cls in obj._parent_types:
-            for robj in self.registry[self.get_class_name(cls)].values():
-                if robj.has_child_object(obj):
+        for cls in obj._parent_types.values():
+            for robj in parents:
+                if robj.__class__ is cls and robj not in ret:
                     ret.append(robj)
         return ret
 
@@ -108,6 +151,12 @@ def add_obj(self):
 KubeBaseObj.add_obj = add_obj
 
 
+def field_changed(self, k, old, new):
+    return _REG.field_changed(self, k, old, new)
+
+KubeBaseObj.field_changed = field_changed
+
+
 def get_ns(self, name):
     ret = _REG.get_id(Namespace, name)
     if ret is None:
@@ -136,3 +185,11 @@ def init(is_openshift):
 
 def obj_registry():
     return _REG
+
+
+def reset(weak=False):
+    global _REG
+    for objs in _REG.registry.values():
+        for obj in list(objs.values()):
+            obj._data.owner = None
+    _REG = ObjectRegistry(weak)
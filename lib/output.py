@@ -5,6 +5,8 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import hashlib
+import json
 import os
 import sys
 import weakref
@@ -13,7 +15,7 @@ import kube_objs
 import var_types
 from kube_obj import KubeObj
 from kube_yaml import yaml_safe_dump
-from util import mkdir_p
+from util import mkdir_p, file_has_content, run_parallel
 from user_error import UserError
 
 
@@ -21,7 +23,31 @@ class RubiksOutputError(Exception):
     pass
 
 
+class IncrementalFallback(Exception):
+    pass
+
+
+def write_data(tmpname, filename, data):
+    if file_has_content(filename, data):
+        return 'unchanged'
+
+    with open(tmpname, 'wb') as f:
+        f.write(data)
+    os.rename(tmpname, filename)
+    return 'written'
+
+
+def _get_content(ops):
+    return [(op.get_content(), op.is_confidential, op.is_volatile) for op in ops]
+
+
+def _write_data(targets):
+    return [write_data(*target) for target in targets]
+
+
 class OutputCollection(object):
+    manifest_file = '.rubiks-manifest.json'
+
     def __init__(self, loader, repository):
         self.repository = repository
         self.clusterless = {}
@@ -29,6 +55,12 @@ class OutputCollection(object):
         self.cluster_mode = (len(self.repository.get_clusters()) != 0)
         self.loader = weakref.ref(loader)
         self.set_confidentiality_mode()
+        self.write_counts = {'written': 0, 'unchanged': 0, 'skipped': 0, 'removed': 0}
+        self.manifest = {}
+        self.previous_manifest = {}
+        self.jobs = 1
+        self.low_memory = False
+        self.pending_writes = []
 
     def set_confidentiality_mode(self):
         self.confidential = ConfidentialOutput
@@ -70,6 +102,9 @@ class OutputCollection(object):
                 cluster = kobj._in_cluster.name
 
         op = OutputMember(self, kobj, cluster)
+        source = self.loader().compiling_file()
+        if source is not None:
+            op.sources.append(source)
         if not op.is_namespace:
             self.add_output(op.kobj.namespace)
 
@@ -85,23 +120,204 @@ class OutputCollection(object):
             outputs[op.namespace_name] = {}
         outputs = outputs[op.namespace_name]
 
+        if isinstance(outputs.get(op.identifier, None), PrerenderedOutputMember):
+            if not op.is_namespace:
+                self.loader().incremental_conflict('{} was already output by {}'.format(
+                    op.identifier, ', '.join(outputs[op.identifier].sources)))
+            op.reused = outputs[op.identifier]
+            op.sources = op.reused.sources + op.sources
+            del outputs[op.identifier]
+
         self.check_for_dupes(op)
 
         if op.identifier not in outputs:
             outputs[op.identifier] = op
+        elif source is not None and source not in outputs[op.identifier].sources:
+            outputs[op.identifier].sources.append(source)
 
         outputs[op.identifier].render()
 
-    def write_output(self):
+    def add_prerendered(self, member):
+        if member.cluster is None:
+            outputs = self.clusterless
+        else:
+            if member.cluster not in self.clustered:
+                self.clustered[member.cluster] = {}
+            outputs = self.clustered[member.cluster]
+
+        if member.namespace_name not in outputs:
+            outputs[member.namespace_name] = {}
+        outputs[member.namespace_name][member.identifier] = member
+
+    def merge_prerendered(self, member):
+        """add output rendered by another process, returns False if it clashes with what is there"""
+        existing = []
+        for c, outputs in [(None, self.clusterless)] + list(self.clustered.items()):
+            if c is not None and member.cluster is not None and c != member.cluster:
+                continue
+            if member.identifier in outputs.get(member.namespace_name, {}):
+                existing.append(outputs[member.namespace_name][member.identifier])
+
+        if len(existing) == 0:
+            self.add_prerendered(member)
+            return True
+
+        op = existing[0]
+        if len(existing) != 1 or not member.is_namespace or op.cluster != member.cluster or \
+                op.content != member.content:
+            return False
+
+        op.sources.extend(s for s in member.sources if s not in op.sources)
+        return True
+
+    def save_all(self):
+        """all outputs rendered as they would be written"""
+        show_confidential = var_types.VarContext.show_confidential
+        if issubclass(self.confidential, ConfidentialOutputHidden):
+            var_types.VarContext.show_confidential = False
+        try:
+            return [op.save() for op in self.all_members()]
+        finally:
+            var_types.VarContext.show_confidential = show_confidential
+
+    def all_members(self):
+        for ns in self.clusterless:
+            for op in self.clusterless[ns].values():
+                yield op
+        for c in self.clustered:
+            for ns in self.clustered[c]:
+                for op in self.clustered[c][ns].values():
+                    yield op
+
+    def check_reused(self):
+        for op in self.all_members():
+            if op.reused is None:
+                continue
+            if op.reused.has_data() != op.has_data() or (op.has_data() and op.get_content() != op.reused.content):
+                raise IncrementalFallback('{} differs from the one output by {}'.format(
+                    op.identifier, ', '.join(op.reused.sources)))
+
+    def render_all(self):
+        for op in self.all_members():
+            if op.has_data() and op.content is None:
+                op.get_content()
+
+    def write_output(self, jobs=1, low_memory=False):
+        self.jobs = jobs
+        self.low_memory = low_memory
         self.base = os.path.join(self.repository.basepath, self.repository.outputs)
         self.debug(2, "writing output to {}".format(self.base))
+        self.previous_manifest = self.load_manifest()
         if self.cluster_mode:
             self._write_output_clustered()
         else:
             self._write_output_clusterless()
+        self.prune()
+        self.save_manifest()
+        self.debug(1, "{written} files written, {unchanged} unchanged, {skipped} skipped, {removed} removed".format(
+            **self.write_counts))
+
+    def write_member(self, op, path, confidential):
+        target = op.prepare_write(path)
+        if target is None:
+            self.write_counts['skipped'] += 1
+        else:
+            if self.jobs > 1:
+                self.pending_writes.append(target)
+            else:
+                self.write_counts[write_data(*target)] += 1
+            entry = {
+                'confidential': op.is_confidential,
+                'sources': sorted(op.sources),
+                }
+            if not op.is_confidential:
+                # the manifest gets committed, a hash of deterministic output would give short secrets away
+                entry['hash'] = op.content_hash
+            self.manifest[os.path.relpath(os.path.join(op.filedir, op.filename), self.base)] = entry
+        confidential.add_file(op)
+        if self.low_memory:
+            op.release()
+
+    def prerender(self):
+        if self.jobs <= 1:
+            return
+
+        # members which get re-rendered at write time depend on write order, so they stay serial
+        groups = {}
+        for op in self.all_members():
+            if op.content is None and not isinstance(op, PrerenderedOutputMember) and \
+                    not op.kobj._always_regenerate and op.has_data():
+                groups.setdefault((op.cluster or '', op.namespace_name), []).append(op)
+
+        work = [groups[k] for k in sorted(groups)]
+        self.debug(2, "rendering {} outputs with {} jobs".format(sum(map(len, work)), self.jobs))
+        for ops, results in zip(work, run_parallel(_get_content, work, self.jobs)):
+            for op, (content, is_confidential, is_volatile) in zip(ops, results):
+                op.content = content
+                op.is_confidential = is_confidential
+                op.is_volatile = is_volatile
+
+    def flush_writes(self):
+        if len(self.pending_writes) == 0:
+            return
+
+        groups = {}
+        for target in self.pending_writes:
+            groups.setdefault(os.path.dirname(target[1]), []).append(target)
+        self.pending_writes = []
+
+        work = [groups[k] for k in sorted(groups)]
+        for results in run_parallel(_write_data, work, self.jobs):
+            for ret in results:
+                self.write_counts[ret] += 1
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.base, self.manifest_file)) as f:
+                return json.load(f)['files']
+        except (IOError, OSError, ValueError, KeyError):
+            return {}
+
+    def save_manifest(self):
+        filename = os.path.join(self.base, self.manifest_file)
+        data = json.dumps({'files': self.manifest}, indent=1, sort_keys=True, separators=(',', ': ')) + '\n'
+        data = data.encode('utf8')
+        if file_has_content(filename, data):
+            return
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(filename + '.tmp', filename)
+
+    def add_previous_confidential(self, confidential):
+        # so that git management files get cleaned up where there are no confidential files left
+        for path in self.previous_manifest:
+            if self.previous_manifest[path]['confidential']:
+                confidential.add_dir(os.path.dirname(os.path.join(self.base, path)))
+
+    def prune(self):
+        for path in sorted(self.previous_manifest):
+            if path in self.manifest:
+                continue
+            self.debug(3, "removing stale file {}".format(path))
+            try:
+                os.unlink(os.path.join(self.base, path))
+                self.write_counts['removed'] += 1
+            except OSError:
+                pass
+
+            d = os.path.dirname(path)
+            while d != '':
+                try:
+                    os.rmdir(os.path.join(self.base, d))
+                except OSError:
+                    break
+                d = os.path.dirname(d)
 
     def _write_output_clustered(self):
         with self.confidential(self.base) as confidential:
+            self.prerender()
+            self.check_reused()
+            self.add_previous_confidential(confidential)
             for c in self.repository.get_clusters():
                 path = os.path.join(self.base, c)
                 mkdir_p(path)
@@ -116,8 +332,7 @@ class OutputCollection(object):
 
                     if any(map(lambda x: x.has_data() and not x.is_namespace, outputs)):
                         for op in outputs:
-                            op.write_file(path)
-                            confidential.add_file(op)
+                            self.write_member(op, path, confidential)
 
                 if not c in self.clustered:
                     continue
@@ -128,17 +343,24 @@ class OutputCollection(object):
 
                     if any(map(lambda x: x.has_data() and not x.is_namespace, self.clustered[c][ns].values())):
                         for op in self.clustered[c][ns].values():
-                            op.write_file(path)
-                            confidential.add_file(op)
+                            self.write_member(op, path, confidential)
+
+            self.flush_writes()
+            self.render_all()
 
     def _write_output_clusterless(self):
         mkdir_p(self.base)
         with self.confidential(self.base) as confidential:
+            self.prerender()
+            self.check_reused()
+            self.add_previous_confidential(confidential)
             for ns in self.clusterless:
                 if any(map(lambda x: x.has_data() and not x.is_namespace, self.clusterless[ns].values())):
                     for op in self.clusterless[ns].values():
-                        op.write_file(self.base)
-                        confidential.add_file(op)
+                        self.write_member(op, self.base, confidential)
+
+            self.flush_writes()
+            self.render_all()
 
     def check_for_dupes(self, op):
         ret = self._check_for_dupes(op)
@@ -216,33 +438,90 @@ class OutputMember(object):
 
         self.identifier = str(kobj.kubectltype + '-' + getattr(kobj, kobj.identifier))
 
+        self.sources = []
+        self.reused = None
+        self.content = None
+        self.is_volatile = False
+        self.late_render = False
+
     def debug(self, *args, **kwargs):
         return self.coll().debug(*args, **kwargs)
 
     def is_compatible(self, obj):
+        if isinstance(obj, PrerenderedOutputMember):
+            self.coll().loader().incremental_conflict('{} was already output by {}'.format(
+                self.identifier, ', '.join(obj.sources)))
+            return True
         return obj.__class__ is self.__class__ and obj.kobj is self.kobj
 
     def render(self):
+        # the namespace gets rendered again with everything output into it, mostly for nothing
+        state = self.kobj.render_state()
+        if state is not None and hasattr(self, 'cached_obj') and state == self.render_state:
+            return
         self.cached_obj = self.kobj.do_render()
+        self.render_state = state
 
     def has_data(self):
+        if self.content is not None:
+            return True
         if not hasattr(self, 'cached_obj'):
             self.render()
         return self.cached_obj is not None
 
+    def release(self):
+        # once the content has been worked out nothing else about the object is needed
+        if self.content is None:
+            return
+        self.kobj = None
+        for k in ('cached_obj', 'cached_yaml', 'render_state'):
+            self.__dict__.pop(k, None)
+
     def yaml(self):
         self.cached_yaml = yaml_safe_dump(self.cached_obj, default_flow_style=False)
 
-    def write_file(self, path):
-        if not hasattr(self, 'cached_obj') or self.kobj._always_regenerate:
+    def get_content(self):
+        if self.content is not None:
+            return self.content
+
+        if not hasattr(self, 'cached_obj'):
+            self.render()
+        elif self.kobj._always_regenerate:
+            prev_obj = self.cached_obj
             self.render()
+            if self.cached_obj != prev_obj:
+                # changed after it was output, so it depends on whatever ran since
+                self.late_render = True
 
         if self.cached_obj is None:
-            return
+            return None
 
         if not hasattr(self, 'cached_yaml'):
             self.yaml()
 
+        sav_context = var_types.VarContext.current_context
+        var_types.VarContext.current_context = {'confidential': False, 'volatile': False}
+        try:
+            self.content = str(self.cached_yaml)
+            self.is_confidential = var_types.VarContext.current_context['confidential']
+            self.is_volatile = var_types.VarContext.current_context['volatile']
+        finally:
+            var_types.VarContext.current_context = sav_context
+
+        return self.content
+
+    def write_file(self, path):
+        target = self.prepare_write(path)
+        if target is None:
+            return 'skipped'
+        return write_data(*target)
+
+    def prepare_write(self, path):
+        content = self.get_content()
+
+        if content is None:
+            return None
+
         if self.uses_namespace:
             path = os.path.join(path, self.namespace_name)
             mkdir_p(path)
@@ -252,21 +531,54 @@ class OutputMember(object):
 
         self.debug(3, "writing file {}/{}".format(self.filedir, self.filename))
 
-        sav_context = var_types.VarContext.current_context
-        var_types.VarContext.current_context = {'confidential': False}
-        try:
-            content = str(self.cached_yaml)
-            self.is_confidential = var_types.VarContext.current_context['confidential']
-        finally:
-            var_types.VarContext.current_context = sav_context
-
         if self.is_confidential:
             self.debug(3, "  file {}/{} is confidential".format(self.filedir, self.filename))
 
-        with open(os.path.join(path, '.' + self.identifier + '.tmp'), 'w') as f:
-            f.write(content)
-        os.rename(os.path.join(path, '.' + self.identifier + '.tmp'),
-                  os.path.join(path, self.filename))
+        data = content if isinstance(content, bytes) else content.encode('utf8')
+        self.content_hash = hashlib.sha1(data).hexdigest()
+        return (os.path.join(path, '.' + self.identifier + '.tmp'), os.path.join(path, self.filename), data)
+
+    def save(self):
+        return {
+            'cluster': self.cluster,
+            'namespace': self.namespace_name,
+            'identifier': self.identifier,
+            'is_namespace': self.is_namespace,
+            'uses_namespace': self.uses_namespace,
+            'content': self.get_content(),
+            'is_confidential': self.is_confidential,
+            'late_render': self.late_render,
+            'sources': self.sources,
+            }
+
+
+class PrerenderedOutputMember(OutputMember):
+    """output from a previous run, for sources which didn't need to be run again"""
+    def __init__(self, coll, saved):
+        self.coll = weakref.ref(coll)
+        self.cluster = saved['cluster']
+        self.namespace_name = saved['namespace']
+        self.identifier = saved['identifier']
+        self.is_namespace = saved['is_namespace']
+        self.uses_namespace = saved['uses_namespace']
+        self.content = saved['content']
+        self.is_confidential = saved['is_confidential']
+        self.late_render = saved['late_render']
+        self.sources = saved['sources']
+        self.is_volatile = False
+        self.reused = None
+
+    def is_compatible(self, obj):
+        return False
+
+    def render(self):
+        pass
+
+    def has_data(self):
+        return self.content is not None
+
+    def get_content(self):
+        return self.content
 
 
 class ConfidentialOutput(object):
@@ -276,6 +588,9 @@ class ConfidentialOutput(object):
     def add_file(self, output_file):
         pass
 
+    def add_dir(self, filedir):
+        pass
+
     def generate(self):
         pass
 
@@ -283,7 +598,8 @@ class ConfidentialOutput(object):
         return self
 
     def __exit__(self, etyp, evalue, etb):
-        self.generate()
+        if etyp is None:
+            self.generate()
         return False
 
 
@@ -295,7 +611,8 @@ class ConfidentialOutputHidden(ConfidentialOutput):
 
     def __exit__(self, etyp, evalue, etb):
         var_types.VarContext.show_confidential = self.show_confidential
-        self.generate()
+        if etyp is None:
+            self.generate()
         return False
 
 
@@ -309,58 +626,61 @@ class ConfidentialOutputGitMgmt(ConfidentialOutput):
 
     def add_file(self, output_file):
         if output_file.is_confidential:
-            if output_file.filedir not in self.gitmgmt:
-                self.gitmgmt[output_file.filedir] = set()
+            self.add_dir(output_file.filedir)
             self.gitmgmt[output_file.filedir].add(output_file.filename)
 
+    def add_dir(self, filedir):
+        if filedir not in self.gitmgmt:
+            self.gitmgmt[filedir] = set()
+
     def gen_line(self, f):
         return f
 
     def generate(self):
         if not self.single:
-            return generate_multi()
+            return self.generate_multi()
 
+        managed = []
+        for gmp in sorted(self.gitmgmt):
+            relpath = os.path.relpath(gmp, self.basedir)
+            assert not relpath.startswith('../')
+            managed.extend(map(lambda x: self.gen_line('/' + relpath + '/' + x), sorted(self.gitmgmt[gmp])))
+
+        self.update_file(self.basedir, managed)
+
+    def generate_multi(self):
+        for gmp in self.gitmgmt:
+            self.update_file(gmp, list(map(lambda x: self.gen_line('/' + x), sorted(self.gitmgmt[gmp]))),
+                             remove_empty=True)
+
+    def update_file(self, path, managed, remove_empty=False):
+        filename = os.path.join(path, self.file)
         try:
-            with open(os.path.join(self.basedir, self.file)):
-                lines = f.read().splitlines()
-        except:
-            lines = []
+            with open(filename) as f:
+                old_lines = f.read().splitlines()
+        except (IOError, OSError):
+            old_lines = None
 
+        lines = list(old_lines or ())
         try:
             lines = lines[:lines.index(self.line)]
         except ValueError:
             pass
 
+        if remove_empty and len(lines) == 0 and len(managed) == 0:
+            if old_lines is not None:
+                os.unlink(filename)
+            return
+
         lines.append(self.line)
+        lines.extend(managed)
 
-        for gmp in sorted(self.gitmgmt):
-            relpath = os.path.relpath(gmp, self.basedir)
-            assert not relpath.startswith('../')
-            lines.extend(map(lambda x: self.gen_line('/' + relpath + '/' + x), sorted(self.gitmgmt[gmp])))
+        if lines == old_lines:
+            return
 
-        with open(os.path.join(self.basedir, self.file + '.tmp'), 'w') as f:
+        with open(filename + '.tmp', 'w') as f:
             f.write('\n'.join(lines) + '\n')
-        os.rename(os.path.join(self.basedir, self.file + '.tmp'), os.path.join(self.basedir, self.file))
-
-    def generate_multi(self):
-        for gmp in self.gitmgmt:
-            try:
-                with open(os.path.join(gmp, self.file)) as f:
-                    lines = f.read().splitlines()
-            except:
-                lines = []
-
-            try:
-                lines = lines[:lines.index(self.line)]
-            except ValueError:
-                pass
-
-            lines.append(self.line)
-            lines.extend(map(lambda x: self.gen_line('/' + x), sorted(self.gitmgmt[gmp])))
-
-            with open(os.path.join(gmp, self.file + '.tmp'), 'w') as f:
-                f.write('\n'.join(lines) + '\n')
-            os.rename(os.path.join(gmp, self.file + '.tmp'), os.path.join(gmp, self.file))
+        os.rename(filename + '.tmp', filename)
 
 
 class ConfidentialOutputGitIgnore(ConfidentialOutputGitMgmt):
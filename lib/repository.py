@@ -21,6 +21,7 @@ class Repository(object):
         self.populate_status()
         self.sources = 'sources'
         self.outputs = 'generated'
+        self.cache = '.rubiks-cache'
 
     def find_worktree(self):
         p = subprocess.Popen(['git', 'worktree', 'list', '--porcelain'], cwd=self.cwd,
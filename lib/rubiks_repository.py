@@ -67,6 +67,8 @@ class RubiksRepository(repository.Repository):
                     self.sources = m_cp.get('layout', 'sources', raw=True)
                 if m_cp.has_option('layout', 'outputs'):
                     self.outputs = m_cp.get('layout', 'outputs', raw=True)
+                if m_cp.has_option('layout', 'cache'):
+                    self.cache = m_cp.get('layout', 'cache', raw=True).strip()
                 if m_cp.has_option('layout', 'pythonpath'):
                     self.pythonpath = list(map(lambda x: os.path.join(self.basepath, x.strip()),
                                                m_cp.get('layout', 'pythonpath', raw=True).split(',')))
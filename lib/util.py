@@ -5,11 +5,65 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import multiprocessing
 import os
 
+_parallel_fn = None
+_parallel_work = None
+
 
 def mkdir_p(path, *args):
     parent, cur = os.path.split(path)
     if not os.path.isdir(path):
         mkdir_p(parent, *args)
         os.mkdir(path, *args)
+
+
+def file_has_content(path, data):
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except (IOError, OSError):
+        return False
+
+
+def _parallel_call(i):
+    return _parallel_fn(_parallel_work[i])
+
+
+def fork_context():
+    """what run_parallel makes its processes with, None where they can't be forked"""
+    if not hasattr(os, 'fork'):
+        return None
+    if not hasattr(multiprocessing, 'get_context'):
+        return multiprocessing
+    try:
+        return multiprocessing.get_context('fork')
+    except ValueError:
+        return None
+
+
+def run_parallel(fn, work, jobs, fresh=False):
+    """fn(item) for each item in work, in forked processes - only the results get pickled"""
+    global _parallel_fn, _parallel_work
+    context = fork_context()
+    if context is None:
+        # the workers only see fn and work by inheriting them, which needs fork
+        return [fn(item) for item in work]
+
+    _parallel_fn = fn
+    _parallel_work = work
+    pool = context.Pool(jobs, maxtasksperchild=1 if fresh else None)
+    try:
+        ret = pool.map(_parallel_call, range(len(work)), chunksize=1)
+        pool.close()
+        return ret
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _parallel_fn = None
+        _parallel_work = None
@@ -0,0 +1,57 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import python_path
+import code_cache
+
+
+class TestCodeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_code(self, code):
+        ns = {}
+        exec(code, ns)
+        return ns['x']
+
+    def test_memory_and_disk(self):
+        c = code_cache.CodeCache(self.tmpdir)
+        code = c.compile('x = 1 + 2\n', 'a.kube')
+        self.assertTrue(c.compile('x = 1 + 2\n', 'a.kube') is code)
+        self.assertEqual(len(os.listdir(os.path.join(self.tmpdir, 'code'))), 1)
+        key = c.key('x = 1 + 2\n', 'a.kube')
+        self.assertEqual(os.listdir(os.path.dirname(c.cache_file(key))), [key[2:]])
+
+        c = code_cache.CodeCache(self.tmpdir)
+        self.assertEqual(self.run_code(c.compile('x = 1 + 2\n', 'a.kube')), 3)
+        self.assertEqual(c.compile('x = 1 + 2\n', 'a.kube').co_filename, 'a.kube')
+        self.assertEqual(c.compile('x = 1 + 2\n', 'b.kube').co_filename, 'b.kube')
+        self.assertEqual(self.run_code(c.compile('x = 2 + 2\n', 'a.kube')), 4)
+
+    def test_corrupt_entry(self):
+        c = code_cache.CodeCache(self.tmpdir)
+        key = c.key('x = 5\n', 'a.kube')
+        c.compile('x = 5\n', 'a.kube')
+        with open(c.cache_file(key), 'wb') as f:
+            f.write(b'garbage')
+        c = code_cache.CodeCache(self.tmpdir)
+        self.assertEqual(self.run_code(c.compile('x = 5\n', 'a.kube')), 5)
+
+    def test_no_path(self):
+        c = code_cache.CodeCache()
+        self.assertEqual(self.run_code(c.compile('x = 7\n', 'a.kube')), 7)
+
+if __name__ == '__main__':
+    unittest.main()
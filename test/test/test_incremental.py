@@ -0,0 +1,96 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import python_path
+import incremental
+
+
+class FakeRepository(object):
+    def __init__(self, basepath):
+        self.basepath = basepath
+        self.sources = 'src'
+        self.pythonpath = []
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.tmpdir, 'src'))
+        self.state = incremental.IncrementalState(FakeRepository(self.tmpdir),
+                                                  os.path.join(self.tmpdir, 'cache', 'generate.json'))
+        for f in ('a.gkube', 'b.gkube', 'lib.kube', 'data.yaml'):
+            self.write(f, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.tmpdir, 'src', name), 'w') as f:
+            f.write(content)
+
+    def output(self, identifier, sources, is_namespace=False):
+        return {'identifier': identifier, 'sources': sources, 'is_namespace': is_namespace,
+                'late_render': False}
+
+    def save(self, outputs):
+        files = {
+            'a.gkube': self.state.file_entry('a.gkube', ['lib.kube'], [], False),
+            'b.gkube': self.state.file_entry('b.gkube', [], ['src/data.yaml'], False),
+            'lib.kube': self.state.file_entry('lib.kube', [], [], False),
+            }
+        self.state.save(files, outputs)
+        self.assertTrue(self.state.load())
+
+    def plan(self):
+        load, compiled, reused = self.state.plan(['a.gkube', 'b.gkube'])
+        return sorted(load), sorted(o['identifier'] for o in reused)
+
+    def test_unchanged(self):
+        self.save([self.output('a', ['a.gkube']), self.output('b', ['b.gkube'])])
+        self.assertEqual(self.plan(), ([], ['a', 'b']))
+
+    def test_changed_import(self):
+        self.save([self.output('a', ['a.gkube']), self.output('b', ['b.gkube'])])
+        self.write('lib.kube', 'changed')
+        self.assertEqual(self.plan(), (['a.gkube'], ['b']))
+
+    def test_changed_input(self):
+        self.save([self.output('a', ['a.gkube']), self.output('b', ['b.gkube'])])
+        self.write('data.yaml', 'changed')
+        self.assertEqual(self.plan(), (['b.gkube'], ['a']))
+
+    def test_shared_outputs(self):
+        self.save([self.output('ns', ['a.gkube', 'b.gkube'], True), self.output('x', ['a.gkube', 'b.gkube'])])
+        self.write('a.gkube', 'changed')
+        load, compiled, reused = self.state.plan(['a.gkube', 'b.gkube'])
+        self.assertEqual(sorted(load), ['a.gkube', 'b.gkube'])
+        self.assertEqual(reused, [])
+
+        self.save([self.output('ns', ['a.gkube', 'b.gkube'], True)])
+        self.write('a.gkube', 'changed again')
+        load, compiled, reused = self.state.plan(['a.gkube', 'b.gkube'])
+        self.assertEqual(sorted(load), ['a.gkube'])
+        self.assertEqual(reused[0]['sources'], ['b.gkube'])
+
+    def test_late_render(self):
+        outputs = [self.output('a', ['a.gkube'])]
+        outputs[0]['late_render'] = True
+        self.save(outputs)
+        self.assertEqual(self.plan(), ([], ['a']))
+        self.write('b.gkube', 'changed')
+        self.assertTrue(self.state.plan(['a.gkube', 'b.gkube']) is None)
+
+    def test_no_state(self):
+        self.assertFalse(self.state.load())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import pickle
+import unittest
+
+import python_path
+import kube_loader
+import kube_objs
+import obj_registry
+import user_error
+from kube_objs.pod import ContainerPort, ContainerSpec
+
+
+class TestKubeObj(unittest.TestCase):
+    def setUp(self):
+        obj_registry.reset()
+
+    def tearDown(self):
+        obj_registry.reset()
+
+    def test_data(self):
+        p = ContainerPort(name='http', containerPort=80)
+        self.assertEqual(p.containerPort, 80)
+        self.assertEqual(p['name'], 'http')
+        self.assertTrue('hostPort' in p._data)
+        self.assertFalse('nothere' in p._data)
+        self.assertEqual(sorted(p._data.keys()), ['containerPort', 'hostPort', 'name', 'protocol'])
+        self.assertEqual(dict(p._data.items())['containerPort'], 80)
+
+        p.update(hostPort=8080)
+        p['protocol'] = 'UDP'
+        self.assertEqual((p.hostPort, p.protocol), (8080, 'UDP'))
+
+        self.assertRaises(Exception, ContainerPort, nothere=1)
+        for o in (p, ContainerSpec(), kube_objs.DaemonSet('ds')):
+            self.assertFalse(hasattr(o, '__dict__'))
+
+    def test_shared_defaults(self):
+        a = ContainerSpec(name='a', image='a')
+        b = ContainerSpec(name='b', image='b')
+        a.resources.requests.cpu = 1
+        a.ports.append(ContainerPort(containerPort=80))
+        self.assertEqual(b.resources.requests.cpu, None)
+        self.assertEqual(b.ports, [])
+        self.assertEqual(ContainerSpec._get_schema().defaults['resources'].requests.cpu, None)
+
+        c = a.clone(name='c')
+        c.resources.requests.cpu = 2
+        self.assertEqual(a.resources.requests.cpu, 1)
+
+    def test_render_state(self):
+        c = ContainerSpec(name='a', image='a', ports=[ContainerPort(containerPort=80)])
+        state = c.render_state()
+        self.assertTrue(state is not None)
+        self.assertEqual(c.render_state(), state)
+
+        c.image = 'b'
+        self.assertNotEqual(c.render_state(), state)
+        state = c.render_state()
+        c.new_ports(containerPort=81)
+        self.assertNotEqual(c.render_state(), state)
+
+        state = c.render_state()
+        c._data.own('ports')[0].containerPort = 82
+        self.assertNotEqual(c.render_state(), state)
+
+        c.ports.append(ContainerPort(containerPort=83))
+        self.assertTrue(c.render_state() is None)
+
+    def test_validate(self):
+        c = ContainerSpec(name='a', image='a', ports=[ContainerPort(containerPort=80)])
+        self.assertTrue(c.validate())
+        self.assertTrue(c.validate())
+
+        c._data.own('ports')[0].containerPort = -1
+        try:
+            c.validate('c')
+            self.assertTrue(False, "Didn't throw exception")
+        except user_error.UserError as e:
+            self.assertTrue('c.ports' in str(e.exc))
+
+    def test_copy(self):
+        a = ContainerSpec(name='a', image='a')
+        a.resources.limits.memory = '1Gi'
+        for b in (copy.deepcopy(a), pickle.loads(pickle.dumps(a, 2))):
+            self.assertEqual(b.name, 'a')
+            self.assertEqual(b.resources.limits.memory, '1Gi')
+            self.assertEqual(b._caller_file, a._caller_file)
+            b.resources.limits.memory = '2Gi'
+            self.assertEqual(a.resources.limits.memory, '1Gi')
+
+    def test_clone(self):
+        port = ContainerPort(containerPort=80)
+        a = ContainerSpec(name='a', image='a', ports=[port])
+        a.resources.limits.memory = '1Gi'
+        b = a.clone(name='b')
+        c = b.clone(name='c')
+        self.assertTrue(list.__getitem__(b._data, b._data.schema.index['ports']).obj[0] is port)
+
+        port.containerPort = 81
+        a.resources.limits.memory = '2Gi'
+        self.assertEqual((b.ports[0].containerPort, c.ports[0].containerPort), (80, 80))
+        self.assertEqual((b.resources.limits.memory, c.resources.limits.memory), ('1Gi', '1Gi'))
+
+        b.ports[0].containerPort = 82
+        b.resources.limits.memory = '3Gi'
+        self.assertEqual((a.ports[0].containerPort, c.ports[0].containerPort), (81, 80))
+        self.assertEqual((a.resources.limits.memory, c.resources.limits.memory), ('2Gi', '1Gi'))
+        self.assertEqual(c.do_render()['ports'], [{'containerPort': 80, 'protocol': 'TCP'}])
+
+    def test_type_index(self):
+        index = kube_objs.KubeBaseObj.type_index()
+        self.assertTrue(ContainerPort in index.types)
+        self.assertEqual(index.concrete[kube_objs.ContainerEnvBaseSpec],
+                         frozenset((kube_objs.ContainerEnvSpec, kube_objs.ContainerEnvSecretSpec)))
+        self.assertEqual(index.parents[ContainerPort], {'ContainerSpec': ContainerSpec})
+
+        c = ContainerSpec(name='a', image='a')
+        c.new_port(containerPort=80)
+        c.new_env(kube_objs.ContainerEnvSpec, name='A', value='b')
+        self.assertEqual((c.ports[0].containerPort, c.env[0].name), (80, 'A'))
+        self.assertRaises(user_error.UserError, c.new_env, ContainerPort, name='A')
+
+    def test_render_unregistered(self):
+        c = ContainerSpec(name='a', image='a', ports=[80, '8080'])
+        c.do_render()
+        self.assertEqual(obj_registry.obj_registry().registry.get('ContainerPort', {}), {})
+        self.assertEqual(list(obj_registry.obj_registry().registry['ContainerSpec'].values()), [c])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import copy
+import gc
+import os
+import shutil
+import tempfile
+import unittest
+import weakref
+
+import python_path
+import load_python
+import loader
+
+
+class FakeRepository(object):
+    def __init__(self, basepath):
+        self.basepath = basepath
+        self.sources = 'src'
+        self.cache = 'cache'
+
+    def get_clusters(self):
+        return []
+
+
+class TestLoader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.repository = FakeRepository(self.tmpdir)
+        self.loader = loader.Loader(self.repository)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def path(self, name):
+        return loader.Path(os.path.join(self.tmpdir, 'src', name), self.repository)
+
+    def test_path(self):
+        os.mkdir(os.path.join(self.tmpdir, 'src'))
+        a = self.path('a.kube')
+        self.assertTrue(self.path('a.kube') is a)
+        self.assertTrue(self.path('./a.kube') is a)
+        self.assertTrue(a.rel_path('b.kube').rel_path('a.kube') is a)
+        self.assertTrue(copy.deepcopy(a) is a)
+        self.assertEqual((a.src_rel_path, a.repo_rel_path, a.dot_path()), ('a.kube', 'src/a.kube', '.a'))
+        self.assertEqual(set((a, self.path('a.kube'))), set((a,)))
+        self.assertRaises(AttributeError, setattr, a, 'extension', 'gkube')
+        self.assertRaises(loader.LoaderNotInSourcesException, self.path, '../a.kube')
+        self.assertFalse(loader.Path(a.full_path, FakeRepository(self.tmpdir)) is a)
+
+        # the paths don't keep the repository alive
+        repository = FakeRepository(self.tmpdir)
+        loader.Path(a.full_path, repository)
+        ref = weakref.ref(repository)
+        del repository
+        gc.collect()
+        self.assertTrue(ref() is None)
+
+    def test_deps(self):
+        a, b, c, d = map(self.path, ('a.gkube', 'b.kube', 'c.kube', 'd.kube'))
+        self.loader.add_dep(a, b)
+        self.loader.add_dep(b, c)
+        self.loader.add_dep(a, c)
+        self.loader.add_dep(d, b)
+        self.assertEqual(self.loader.deps, {'a.gkube': set(('b.kube', 'c.kube')), 'b.kube': set(('c.kube',)),
+                                            'd.kube': set(('b.kube',))})
+
+        for s, t, loop in ((c, a, 'c.kube imports a.gkube imports c.kube'),
+                           (c, d, 'c.kube imports d.kube imports b.kube imports c.kube'),
+                           (c, b, 'c.kube imports b.kube imports c.kube'),
+                           (c, c, 'c.kube imports c.kube')):
+            try:
+                self.loader.add_dep(s, t)
+                self.assertTrue(False, "Didn't throw exception")
+            except loader.LoaderLoopException as e:
+                self.assertEqual(str(e), 'Loop detected: ' + loop)
+        self.assertEqual(self.loader.deps['c.kube'], set())
+
+    def test_find_python(self):
+        for f in ('a.gkube', 'x.yaml', 'sub/b.ekube', 'sub/c.kube', '.hidden/d.gkube'):
+            if not os.path.isdir(os.path.dirname(os.path.join(self.tmpdir, 'src', f))):
+                os.makedirs(os.path.dirname(os.path.join(self.tmpdir, 'src', f)))
+            open(os.path.join(self.tmpdir, 'src', f), 'w').close()
+        # symlinks go by the extension of what they point to
+        os.symlink('.hidden/d.gkube', os.path.join(self.tmpdir, 'src', 'd'))
+        os.symlink('x.yaml', os.path.join(self.tmpdir, 'src', 'f.gkube'))
+        for d in ('src', 'src/sub'):
+            os.utime(os.path.join(self.tmpdir, d), (1000000000, 1000000000))
+
+        def _find():
+            collection = load_python.PythonFileCollection(self.repository)
+            return [p.src_rel_path for p in collection.find_python('src')]
+
+        self.assertEqual(_find(), ['a.gkube', '.hidden/d.gkube', 'sub/b.ekube'])
+        self.assertEqual(os.listdir(os.path.join(self.tmpdir, 'cache')), ['sources.json'])
+
+        # directories which haven't changed aren't read again
+        open(os.path.join(self.tmpdir, 'src', 'sub', 'e.gkube'), 'w').close()
+        os.utime(os.path.join(self.tmpdir, 'src/sub'), (1000000000, 1000000000))
+        self.assertEqual(_find(), ['a.gkube', '.hidden/d.gkube', 'sub/b.ekube'])
+        os.utime(os.path.join(self.tmpdir, 'src/sub'), (1000000001, 1000000001))
+        self.assertEqual(_find(), ['a.gkube', '.hidden/d.gkube', 'sub/b.ekube', 'sub/e.gkube'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import gc
+import unittest
+
+import python_path
+import kube_loader
+import obj_registry
+from kube_objs.deployment import Deployment
+from kube_objs.namespace import Namespace
+from kube_objs.pod import ContainerSpec, PodTemplateSpec
+
+
+class TestObjRegistry(unittest.TestCase):
+    def setUp(self):
+        obj_registry.reset()
+
+    def tearDown(self):
+        obj_registry.reset()
+
+    def test_get_id(self):
+        reg = obj_registry.obj_registry()
+        a = Namespace('a')
+        self.assertEqual(reg.get_id(Namespace, 'a'), [a])
+        self.assertEqual(reg.get_id(Namespace, 'b'), None)
+
+        a.name = 'b'
+        self.assertEqual(reg.get_id(Namespace, 'a'), None)
+        self.assertEqual(reg.get_id(Namespace, 'b'), [a])
+
+        b = a.clone(name='a')
+        self.assertEqual(reg.get_id(Namespace, 'a'), [b])
+        self.assertTrue(a.get_ns('b') is a)
+
+    def test_get_parents(self):
+        pt = PodTemplateSpec(containers=[ContainerSpec(name='a', image='a')])
+        d1 = Deployment('a', pod_template=pt)
+        d2 = Deployment('b')
+        self.assertEqual(pt.get_parents(), [d1])
+
+        d2.pod_template = pt
+        self.assertEqual(sorted(pt.get_parents(), key=lambda x: x.name), [d1, d2])
+
+        d1.pod_template = PodTemplateSpec()
+        self.assertEqual(pt.get_parents(), [d2])
+
+    def test_weak(self):
+        obj_registry.reset(weak=True)
+        reg = obj_registry.obj_registry()
+        ns = Namespace('a')
+        pt = PodTemplateSpec()
+        d = Deployment('a', pod_template=pt)
+        self.assertEqual(reg.get_id(Deployment, 'a'), [d])
+        self.assertEqual(pt.get_parents(), [d])
+
+        d.name = 'b'
+        self.assertEqual(reg.get_id(Deployment, 'b'), [d])
+
+        del d, ns
+        gc.collect()
+        self.assertEqual(reg.get_id(Deployment, 'b'), None)
+        self.assertEqual(pt.get_parents(), [])
+        self.assertEqual(list(reg.registry['Deployment'].values()), [])
+        self.assertEqual(len(reg.get_id(Namespace, 'a')), 1)
+
+if __name__ == '__main__':
+    unittest.main()
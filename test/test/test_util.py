@@ -0,0 +1,46 @@
+# (c) Copyright 2017-2018 OLX
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import multiprocessing
+import os
+import unittest
+
+import python_path
+import util
+
+
+class TestUtil(unittest.TestCase):
+    def test_run_parallel(self):
+        offset = 10
+
+        def _add(x):
+            return (x + offset, os.getpid())
+
+        ret = util.run_parallel(_add, [1, 2, 3], 2)
+        self.assertEqual([r[0] for r in ret], [11, 12, 13])
+        if util.fork_context() is not None:
+            self.assertFalse(os.getpid() in [r[1] for r in ret])
+
+        # doesn't depend on the default start method
+        if hasattr(multiprocessing, 'get_start_method'):
+            method = multiprocessing.get_start_method(allow_none=True)
+            multiprocessing.set_start_method('spawn', force=True)
+            try:
+                self.assertEqual([r[0] for r in util.run_parallel(_add, [1, 2], 2)], [11, 12])
+            finally:
+                multiprocessing.set_start_method(method, force=True)
+
+        # where processes can't be forked everything just runs here
+        save_context = util.fork_context
+        try:
+            util.fork_context = lambda: None
+            self.assertEqual(util.run_parallel(_add, [1, 2], 2), [(11, os.getpid()), (12, os.getpid())])
+        finally:
+            util.fork_context = save_context
+
+if __name__ == '__main__':
+    unittest.main()
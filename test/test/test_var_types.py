@@ -97,5 +97,18 @@ class TestBasicVarTypes(unittest.TestCase):
         SHOW = False
         self.assertEqual(str(r), "a:\n  x: '*** HIDDEN ***'\n  y: plain\nb: '*** HIDDEN ***'\nc: xyzzy\n")
 
+    def test_yaml_many_vars(self):
+        global SHOW
+
+        v = {'k{:03d}'.format(i): Confidential('v{}'.format(i)) for i in range(200)}
+        v['plain'] = ['a', 'b']
+        r = kube_yaml.yaml_safe_dump(v)
+        self.assertTrue(isinstance(r, var_types.VarEntity))
+        SHOW = True
+        self.assertEqual(str(r), ''.join('k{:03d}: v{}\n'.format(i, i) for i in range(200)) + "plain:\n- a\n- b\n")
+        SHOW = False
+        self.assertEqual(str(r), ''.join("k{:03d}: '*** HIDDEN ***'\n".format(i) for i in range(200)) +
+                         "plain:\n- a\n- b\n")
+
 if __name__ == '__main__':
     unittest.main()
@@ -10,6 +10,7 @@ import unittest
 
 import python_path
 import kube_yaml
+import yaml
 
 
 class TestBasicYAML(unittest.TestCase):
@@ -44,5 +45,56 @@ qux: |-
 """
         self.assertEqual(kube_yaml.yaml_safe_dump(src).strip(), dst.strip())
 
+    def test_fast_path_matches_pyyaml(self):
+        src = OrderedDict(z={'b': [1, -2.5, 1e17, None, True, 'false', '', '0x1f', {}, []],
+                             'a': [['x', 'y'], {'k': 'v', 'l': ['m']}]})
+        src['long'] = ' '.join(['word'] * 40)
+        src['quoted'] = "it's: " + 'text ' * 20
+        src['keep'] = 'trailing\n\n'
+        src['lead'] = '  indented\nlines\n'
+        src['special'] = 'tab\there \x07\u2028'
+        src['k: ey'] = '- item'
+        self.assertEqual(kube_yaml.fast_yaml_safe_dump(src), kube_yaml.pyyaml_safe_dump(src))
+        self.assertEqual(kube_yaml.yaml_safe_dump([src]), kube_yaml.pyyaml_safe_dump([src]))
+
+    def test_fast_path_fallback(self):
+        shared = ['a', 'b']
+        src = {'x': shared, 'y': shared}
+        self.assertRaises(kube_yaml.FastPathUnsupported, kube_yaml.fast_yaml_safe_dump, src)
+        self.assertEqual(kube_yaml.yaml_safe_dump(src), kube_yaml.pyyaml_safe_dump(src))
+        self.assertTrue('&id001' in kube_yaml.yaml_safe_dump(src))
+
+        src = {'x' * 130: 'long key', 1: 'int key'}
+        self.assertRaises(kube_yaml.FastPathUnsupported, kube_yaml.fast_yaml_safe_dump, src)
+
+    def test_find_loader(self):
+        class WorkingLoader(yaml.SafeLoader):
+            pass
+
+        class BrokenLoader(yaml.SafeLoader):
+            def __init__(self, stream):
+                raise ImportError('no libyaml')
+
+        saved = (getattr(yaml, '__with_libyaml__', False), getattr(yaml, 'CSafeLoader', None))
+        try:
+            yaml.__with_libyaml__ = True
+            yaml.CSafeLoader = WorkingLoader
+            self.assertTrue(kube_yaml.find_loader() is WorkingLoader)
+
+            yaml.CSafeLoader = BrokenLoader
+            self.assertTrue(kube_yaml.find_loader() is yaml.SafeLoader)
+
+            yaml.__with_libyaml__ = False
+            yaml.CSafeLoader = None
+            self.assertTrue(kube_yaml.find_loader() is yaml.SafeLoader)
+        finally:
+            yaml.__with_libyaml__, yaml.CSafeLoader = saved
+            if saved[1] is None:
+                del yaml.CSafeLoader
+
+        if saved[0]:
+            self.assertTrue(kube_yaml.find_loader() is yaml.CSafeLoader)
+        self.assertEqual(kube_yaml.yaml_load('a: [1, b]'), {'a': [1, 'b']})
+
 if __name__ == '__main__':
     unittest.main()